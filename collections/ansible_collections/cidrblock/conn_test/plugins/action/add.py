@@ -1,19 +1,66 @@
 from __future__ import absolute_import, division, print_function
 import json 
+from importlib.util import find_spec
 
 
 __metaclass__ = type
 from ansible.plugins.action import ActionBase
 from ansible.errors import AnsibleError
-from ansible_collections.cidrblock.conn_test.plugins.module_utils.argspec_validate import AnsibleArgSpecValidator
+from ansible_collections.cidrblock.conn_test.plugins.module_utils.argspec_validate import (
+    AnsibleArgSpecValidator,
+    DEFAULT_CHUNK_SIZE,
+)
 from ansible_collections.cidrblock.conn_test.plugins.modules.add import (
     DOCUMENTATION,
 )
 
 ARGSPEC_CONDITIONALS = {
-    "required_together": [["third", "fourth"]],
+    "required_together": [["first", "second"], ["third", "fourth"]],
+    "required_one_of": [["first", "operands"]],
+    "mutually_exclusive": [
+        ["first", "operands"],
+        ["second", "operands"],
+        ["third", "operands"],
+        ["fourth", "operands"],
+    ],
+    "argument_spec": {
+        "operands": {"required_together": [["third", "fourth"]]},
+    },
 }
 
+OPERANDS = ("first", "second", "third", "fourth")
+
+# numpy is imported on first use, and only used for enough operand
+# sets to outweigh building the array
+HAS_NUMPY = find_spec("numpy") is not None
+NUMPY_MIN_ROWS = 256
+
+# operand sets validated in chunks rather than memoized
+CHUNKED_MIN_OPERANDS = 1000
+
+
+def sum_operands(operands):
+    """Sum each set of operands, vectorized with numpy when available
+
+    :param operands: The validated operand sets
+    :type operands: list
+    :return: The sum of each operand set
+    :rtype: list
+    """
+    if HAS_NUMPY and len(operands) >= NUMPY_MIN_ROWS:
+        import numpy
+
+        columns = numpy.array(
+            [[entry[key] for key in OPERANDS] for entry in operands],
+            dtype=float,
+        )
+        return numpy.nansum(columns, axis=1).tolist()
+    return [
+        float(sum(entry[key] for key in OPERANDS if entry[key] is not None))
+        for entry in operands
+    ]
+
+
 
 class ActionModule(ActionBase):
     """ action module
@@ -24,12 +71,19 @@ class ActionModule(ActionBase):
         self._result = None
     
     def _check_argspec(self):
+        operands = self._task.args.get("operands")
+        large = (
+            isinstance(operands, list)
+            and len(operands) >= CHUNKED_MIN_OPERANDS
+        )
         aav = AnsibleArgSpecValidator(
             data=self._task.args,
             schema=DOCUMENTATION,
             schema_conditionals=ARGSPEC_CONDITIONALS,
             schema_format="doc",
             name=self._task.action,
+            memoize=not large,
+            chunk_size=DEFAULT_CHUNK_SIZE if large else None,
         )
         valid, errors, self._task.args = aav.validate()
         self._result["failed"] = not valid
@@ -39,7 +93,11 @@ class ActionModule(ActionBase):
         self._result = super(ActionModule, self).run(tmp, task_vars)
         self._check_argspec()
         self._result['connection_details'] = self._connection.connection_details
-        if self._result["failed"] is not True:
+        if self._result["failed"] is True:
+            return self._result
+        if self._task.args.get("operands") is not None:
+            self._result['sums'] = sum_operands(self._task.args["operands"])
+        else:
             self._result['sum'] = 0
             for entry in ['first', "second", "third", "fourth"]:
                 if self._task.args[entry] is not None:
@@ -1,30 +1,167 @@
 from __future__ import absolute_import, division, print_function
-import json 
+import json
+import os
+import time
 
 
 __metaclass__ = type
 from ansible.plugins.action import ActionBase
+from ansible.errors import AnsibleActionFail
 from ansible.errors import AnsibleError
-from ansible.module_utils.connection import Connection
+
+# The result key, connection method, args and kwargs for each get
+GETS = {
+    "user": ("user", "indirect_method", ["get_user"], {}),
+    "org": ("repos", "direct_method", ["org_repos"], {"org": "ansible-network"}),
+}
+
+# The seconds between checks of a job collected with job_id and wait
+WAIT_INTERVAL = 1
 
 
 class ActionModule(ActionBase):
     """ action module
+
+    The task keywords async and poll run the call as a background job in the
+    persistent connection. With poll above 0 the connection writes the job's
+    result to the async directory as it finishes, where ansible polls it with
+    async_status. With poll: 0 the job id is returned and the result is
+    collected later with the job_id argument. The persistent connection is
+    kept running until the job is collected, the connection is reset or the
+    playbook ends:
+
+    - cidrblock.conn_test.github:
+        get: org
+      async: 600
+      poll: 0
+      register: crawl
+
+    - cidrblock.conn_test.github:
+        job_id: "{{ crawl.ansible_job_id }}"
+        wait: 10
+      register: repos
+      until: repos.finished
+      retries: 60
+
+    Every call of a run is sent over one socket to the persistent
+    connection, a list of gets is pipelined:
+
+    - cidrblock.conn_test.github:
+        get: [user, org]
     """
 
+    _supports_async = True
+
     def __init__(self, *args, **kwargs):
         super(ActionModule, self).__init__(*args, **kwargs)
         self._result = None
-       
-    def run(self, tmp=None, task_vars=None): 
+
+    def _job_result(self, status):
+        """Convert a job status to the task result"""
+        result = {
+            "ansible_job_id": status["job_id"],
+            "started": True,
+            "finished": status["finished"],
+            "elapsed": status["elapsed"],
+        }
+        if status["state"] == "failed":
+            result["failed"] = True
+            result["msg"] = status["msg"]
+        elif status["finished"]:
+            result[GETS[status["label"]][0]] = status["result"]
+        return result
+
+    def _wait(self, connection_proxy, job_id, wait, interval):
+        """Check a job every interval seconds until it finishes or wait
+        seconds have passed, the socket is closed between checks so
+        ansible-connection can serve other tasks and hosts
+        """
+        deadline = time.time() + wait
+        while True:
+            status = connection_proxy.result(job_id)
+            remaining = deadline - time.time()
+            if status["finished"] or remaining <= 0:
+                return status
+            connection_proxy.close()
+            time.sleep(min(interval, remaining))
+
+    def _async_dir(self):
+        """The directory async_status reads job results from"""
+        async_dir = self.get_shell_option('async_dir', default="~/.ansible_async")
+        return self._remote_expand_user(async_dir)
+
+    def _run_async(self, connection_proxy, get):
+        """Submit the call as a job, the task executor polls it with
+        async_status every poll seconds, or return the job id for poll: 0
+        """
+        key, method, args, kwargs = GETS[get]
+        poll = self._task.poll
+        if not poll:
+            job_id = connection_proxy.submit(method, args=args, kwargs=kwargs, label=get)
+            return {"ansible_job_id": job_id, "started": True, "finished": False}
+        # async_status runs in the controller for this connection, as
+        # ansible-connection does, both see the same async directory
+        async_dir = self._async_dir()
+        job_id = connection_proxy.submit(
+            method,
+            args=args,
+            kwargs=kwargs,
+            label=get,
+            results_dir=async_dir,
+            result_key=key,
+        )
+        return {
+            "ansible_job_id": job_id,
+            "started": True,
+            "finished": False,
+            "results_file": os.path.join(async_dir, job_id),
+        }
+
+    def _run_gets(self, connection_proxy, gets):
+        """Pipeline the calls for a list of gets"""
+        unknown = [get for get in gets if get not in GETS]
+        if unknown:
+            raise AnsibleActionFail("get must be one of: {0}".format(", ".join(GETS)))
+        results = connection_proxy.pipeline([GETS[get][1:] for get in gets])
+        for get, result in zip(gets, results):
+            self._result[GETS[get][0]] = result
+
+    def run(self, tmp=None, task_vars=None):
         self._result = super(ActionModule, self).run(tmp, task_vars)
-        connection_proxy = Connection(self._connection._socket_path)
-        if self._task.args['get'] == "user":
+        # Imported here, not when ansible loads the plugin in the controller
+        from ansible_collections.cidrblock.conn_test.plugins.plugin_utils.rpc_client import (
+            RpcClient,
+        )
+
+        connection_proxy = RpcClient(self._connection._socket_path)
+        try:
+            self._run(connection_proxy)
+        finally:
+            # ansible-connection serves one socket at a time
+            connection_proxy.close()
+        return self._result
+
+    def _run(self, connection_proxy):
+        if self._task.args.get('job_id'):
+            status = self._wait(
+                connection_proxy,
+                self._task.args['job_id'],
+                self._task.args.get('wait', 0),
+                WAIT_INTERVAL,
+            )
+            self._result.update(self._job_result(status))
+        elif isinstance(self._task.args['get'], list):
+            if self._task.async_val:
+                raise AnsibleActionFail("get must be a single value with async")
+            self._run_gets(connection_proxy, self._task.args['get'])
+        elif self._task.args['get'] not in GETS:
+            raise AnsibleActionFail("get must be one of: {0}".format(", ".join(GETS)))
+        elif self._task.async_val:
+            self._result.update(self._run_async(connection_proxy, self._task.args['get']))
+        elif self._task.args['get'] == "user":
             # Reuses an existing connection if available, connection will remain across tasks
             self._result['user'] = connection_proxy.indirect_method('get_user')
             # Creates a new connection with every task
             # self._result['user'] = self._connection.indirect_method('get_user')
         elif self._task.args['get'] == "org":
             self._result['repos'] = connection_proxy.direct_method('org_repos', org="ansible-network")
-        return self._result
-     
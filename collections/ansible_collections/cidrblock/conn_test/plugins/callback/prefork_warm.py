@@ -0,0 +1,66 @@
+# (c) 2021 Red Hat Inc.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+author: Ansible Networking Team
+name: prefork_warm
+type: aggregate
+short_description: Compile the action plugin argspecs before the workers fork
+description:
+- When the playbook starts, the action plugins of the collection are imported
+  in the controller and their argspecs compiled, so every worker forked later
+  inherits them rather than compiling them on its first task.
+- Enable it with C(callbacks_enabled = cidrblock.conn_test.prefork_warm).
+version_added: 1.0.0
+requirements:
+- enable in configuration
+options:
+  plugins:
+    type: list
+    elements: str
+    description:
+    - The action plugins to warm, every action plugin in the collection when
+      not set.
+    env:
+    - name: ANSIBLE_PREFORK_WARM_PLUGINS
+    ini:
+    - section: callback_prefork_warm
+      key: plugins
+"""
+
+from ansible.plugins.callback import CallbackBase
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "cidrblock.conn_test.prefork_warm"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def v2_playbook_on_start(self, playbook):
+        """Warm the action plugins, the controller forks
+        the workers after this
+        """
+        from ansible_collections.cidrblock.conn_test.plugins.plugin_utils.prefork import (
+            warm_action_plugins,
+        )
+
+        timings = warm_action_plugins(self.get_option("plugins") or None)
+        for plugin, timing in sorted(timings.items()):
+            if isinstance(timing, float):
+                self._display.vvv(
+                    "prefork_warm: {plugin} compiled in {ms:.1f} ms".format(
+                        plugin=plugin, ms=timing * 1000
+                    )
+                )
+            else:
+                self._display.warning(
+                    "prefork_warm: {plugin} not warmed, {err}".format(
+                        plugin=plugin, err=timing
+                    )
+                )
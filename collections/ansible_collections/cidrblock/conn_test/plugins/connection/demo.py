@@ -1,6 +1,11 @@
 
+from ansible.errors import AnsibleError
 from ansible.plugins.connection import ConnectionBase
 from ansible.utils.display import Display
+from ansible_collections.cidrblock.conn_test.plugins.plugin_utils.credentials import (
+    credential_source,
+    resolve_password,
+)
 
 display = Display()
 
@@ -22,10 +27,27 @@ options:
             - name: ansible_host
             - name: delegated_vars['ansible_host']
     password:
-        description: Authentication password
-        required: True
+        description:
+            - Authentication password
+            - Required unless I(credential_source) is set.
         vars:
             - name: ansible_password
+    credential_source:
+        description:
+            - Resolve the password from a credential source rather than I(password).
+            - C(file) reads the password from the file at I(credential_source_path).
+            - C(vault) looks up I(user) in the json document at I(credential_source_path),
+              a local stand-in for a secrets vault.
+            - Other sources can be added with C(register_credential_source) from
+              plugin_utils/credentials.py.
+        vars:
+            - name: ansible_credential_source
+    credential_source_path:
+        description:
+            - The path used by the I(credential_source).
+        type: path
+        vars:
+            - name: ansible_credential_source_path
     port:
         default: 443
         description: 
@@ -55,6 +77,13 @@ options:
 
     
 
+# The options connection_details is resolved from
+CREDENTIAL_OPTIONS = (
+    'host', 'port', 'user', 'password',
+    'credential_source', 'credential_source_path',
+)
+
+
 class Connection(ConnectionBase):
     ''' Connection credential shim '''
 
@@ -66,17 +95,58 @@ class Connection(ConnectionBase):
         self._port = None
         self._user = None
         self._password = None
-      
-    @property
-    def connection_details(self):
+        self._connection_details = None
+        self._credential_key = None
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        ''' Drop the resolved connection details only when
+        the options they are resolved from change
+        '''
+        super(Connection, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        key = tuple(self._options.get(option) for option in CREDENTIAL_OPTIONS)
+        if key != self._credential_key:
+            self._credential_key = key
+            self._connection_details = None
+
+    def _resolve_connection_details(self):
         self._host = self.get_option('host')
         self._port = self.get_option('port')
         self._user = self.get_option('user')
-        self._password = self.get_option('password')
+        source = self.get_option('credential_source')
+        if source:
+            self._password = resolve_password(
+                source=source,
+                path=self.get_option('credential_source_path'),
+                user=self._user,
+            )
+        else:
+            self._password = self.get_option('password')
+            if self._password is None:
+                raise AnsibleError("password is required when credential_source is not set")
         return {"host": self._host, "port": self._port, "user": self._user, "password": self._password}
 
+    @property
+    def connection_details(self):
+        ''' Resolved once per option set, a copy is returned
+        so the caller cannot change the cached details
+        '''
+        if self._connection_details is None:
+            self._connect()
+        return dict(self._connection_details)
+
     def _connect(self):
-        pass
+        ''' Resolve the connection details, a connected shim is reused
+        by the task executor for the following loop items of the task
+        rather than a new one created for each
+        '''
+        if self._connection_details is None:
+            source = self.get_option('credential_source')
+            if source:
+                # a registered source, not only the ones documented
+                credential_source(source)
+            self._connection_details = self._resolve_connection_details()
+        self._connected = True
+        return self
   
     def exec_command(self, cmd, in_data=None, sudoable=True):
         pass
@@ -88,6 +158,6 @@ class Connection(ConnectionBase):
         pass
  
     def close(self):
-        pass
+        self._connected = False
 
   
\ No newline at end of file
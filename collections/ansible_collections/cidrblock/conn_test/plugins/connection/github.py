@@ -24,6 +24,47 @@ options:
     - name: ansible_gh_access_token
     env:
     - name: ANSIBLE_GH_ACCESS_TOKEN
+  gh_base_url:
+    type: str
+    description:
+    - The base URL of the github API, eg for github enterprise or a local stand-in
+    default: https://api.github.com
+    vars:
+    - name: ansible_gh_base_url
+    env:
+    - name: ANSIBLE_GH_BASE_URL
+  gh_share_connection:
+    type: bool
+    description:
+    - Share a single persistent connection process between every host with the
+      same I(gh_base_url) and I(gh_access_token), rather than one per host.
+    - The socket path is derived from a fingerprint of the two, the hosts sharing
+      it are tracked and the process is closed once every host has reset the
+      connection, or by I(persistent_connect_timeout) once the playbook ends.
+    - "With a shared connection C(meta: reset_connection) only releases the host
+      it runs for, however often it runs."
+    default: False
+    env:
+    - name: ANSIBLE_GH_SHARE_CONNECTION
+    vars:
+    - name: ansible_gh_share_connection
+  gh_inventory_host:
+    type: str
+    description:
+    - The inventory host using the connection, counted when the connection is shared.
+    vars:
+    - name: inventory_hostname
+  persistent_job_workers:
+    type: int
+    description:
+    - The number of background jobs, started with the C(submit) RPC, run at the
+      same time in the persistent connection process.
+    - Further jobs are queued until a worker is free.
+    default: 4
+    env:
+    - name: ANSIBLE_PERSISTENT_JOB_WORKERS
+    vars:
+    - name: ansible_persistent_job_workers
   persistent_connect_timeout:
     type: int
     description:
@@ -94,36 +135,139 @@ options:
     - name: ANSIBLE_PERSISTENT_LOG_FILE_ONLY
     vars:
     - name: ansible_persistent_log_file_only
-
+  persistent_profiler:
+    type: str
+    description:
+    - Profile the persistent connection process with the selected profiler.
+    - C(cprofile) writes pstats output, C(sampling) writes collapsed stacks.
+    - The profiler starts when the persistent connection process starts, or when
+      the value changes, and stops once I(persistent_profile_rpc_count) or
+      I(persistent_profile_duration) is reached, the value is unset or the
+      connection closes.
+    - The profiler can also be controlled with the C(profile) RPC.
+    choices:
+    - cprofile
+    - sampling
+    env:
+    - name: ANSIBLE_PERSISTENT_PROFILER
+    vars:
+    - name: ansible_persistent_profiler
+  persistent_profile_dir:
+    type: path
+    description:
+    - The directory the profiler output is written to.
+    default: ~/.ansible/pc_profiles
+    env:
+    - name: ANSIBLE_PERSISTENT_PROFILE_DIR
+    vars:
+    - name: ansible_persistent_profile_dir
+  persistent_profile_rpc_count:
+    type: int
+    description:
+    - Stop the profiler after this many RPCs, 0 for no limit.
+    default: 0
+    env:
+    - name: ANSIBLE_PERSISTENT_PROFILE_RPC_COUNT
+    vars:
+    - name: ansible_persistent_profile_rpc_count
+  persistent_profile_duration:
+    type: int
+    description:
+    - Stop the profiler after this many seconds, 0 for no limit.
+    - The duration is checked as each RPC completes.
+    default: 0
+    env:
+    - name: ANSIBLE_PERSISTENT_PROFILE_DURATION
+    vars:
+    - name: ansible_persistent_profile_duration
+  persistent_profile_interval:
+    type: float
+    description:
+    - The seconds between samples when using the C(sampling) profiler.
+    default: 0.005
+    env:
+    - name: ANSIBLE_PERSISTENT_PROFILE_INTERVAL
+    vars:
+    - name: ansible_persistent_profile_interval
 """
+import hashlib
 import logging
 import os
-import subprocess
+import socket
+import sys
+import threading
 from collections import namedtuple
 from functools import wraps
 from functools import partial
 
 from ansible.module_utils._text import to_bytes
 from ansible.module_utils.six import PY3
-from ansible.module_utils.six.moves import cPickle
 from ansible.errors import AnsibleConnectionFailure
-from ansible.playbook.play_context import PlayContext
 from ansible.plugins.connection import NetworkConnectionBase, ensure_connect
-from ansible.module_utils.basic import missing_required_lib
-
+from ansible.utils.display import Display
+from ansible_collections.cidrblock.conn_test.plugins.plugin_utils.jobs import (
+    JobRunner,
+)
+from ansible_collections.cidrblock.conn_test.plugins.plugin_utils.profiler import (
+    RpcProfiler,
+)
 
-try:
-    from github import Github
-    from github.GithubException import GithubException
+display = Display()
 
-    HAS_GITHUB = True
-except ImportError:
-    HAS_GITHUB = False
+# PyGithub is imported by _connect, not when ansible loads the plugin for
+# its documentation and options, the names are set by _import_github
+Github = None
+GithubException = None
 
 # Map ansible verbosity level to a python log level
 # in the case surfacing dep python moduel logs is desired
 ANSIBLE_VERBOSITY_TO_LOG_LEVEL = (0, 40, 30, 20, 10)
 
+def connection_fingerprint(base_url, token):
+    """A fingerprint of the endpoint and token, hosts with the same
+    fingerprint can share a connection
+
+    :param base_url: The github API base URL
+    :type base_url: str
+    :param token: The access token
+    :type token: str
+    :return: The first 16 hex digits of the sha256 of both
+    :rtype: str
+    """
+    digest = hashlib.sha256(
+        to_bytes("{base_url}\0{token}".format(base_url=base_url, token=token))
+    )
+    return digest.hexdigest()[:16]
+
+
+# The methods that can be run as background jobs with submit
+JOB_METHODS = ("indirect_method", "direct_method")
+
+# The script names of the persistent connection process, across ansible versions
+PERSISTENT_PROCESS_NAMES = (
+    "ansible-connection",
+    "ansible_connection_cli_stub.py",
+)
+
+
+def _import_github():
+    """Import PyGithub on first use
+
+    :raises AnsibleConnectionFailure: If PyGithub is not installed
+    """
+    global Github, GithubException
+    if Github is not None:
+        return
+    try:
+        from github import Github
+        from github.GithubException import GithubException
+    except ImportError:
+        from ansible.module_utils.basic import missing_required_lib
+
+        raise AnsibleConnectionFailure(
+            missing_required_lib("PyGithub").replace("module", "connection")
+        )
+
 
 class PersistentConnection(NetworkConnectionBase):
     def __init__(self, play_context, new_stdin, *args, **kwargs):
@@ -132,6 +276,8 @@ class PersistentConnection(NetworkConnectionBase):
         )
         self._play_context = play_context
         self._log_level = None
+        self._profiler = None
+        self._profiler_config = None
         self._set_up_logger()
 
     def log_with_pid(func):
@@ -149,6 +295,30 @@ class PersistentConnection(NetworkConnectionBase):
 
         return wrapped
 
+    def profile_rpc(func):
+        """decorator used to count RPCs against an active profiler
+        and stop it once a limit is reached"""
+
+        @wraps(func)
+        def wrapped(self, *args, **kwargs):
+            # the RPC counts against the profiler active when it started,
+            # set_options may replace or clear the profiler
+            profiler = self._profiler
+            if profiler is not None and not profiler.active:
+                profiler = None
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                if profiler is not None:
+                    written = profiler.tick()
+                    if written:
+                        msg = "Profiler stopped, output written to {path}".format(
+                            path=written
+                        )
+                        self._log_with_pid(msg=msg)()
+
+        return wrapped
+
     def _log_with_pid(self, msg):
         """Create a log message with the PID and process name while debugging
 
@@ -158,6 +328,8 @@ class PersistentConnection(NetworkConnectionBase):
         :rtype: Callable
         """
         if self._log_level == logging.DEBUG:
+            import subprocess
+
             pid = os.getpid()
             name = subprocess.check_output(
                 "ps -p {pid} -o command=".format(pid=pid), shell=True
@@ -174,9 +346,9 @@ class PersistentConnection(NetworkConnectionBase):
         Log entries will be sent to the log file or log file and stdout
         based on the connection configuration
         """
-        log_level = ANSIBLE_VERBOSITY_TO_LOG_LEVEL[
-            min(self._play_context.verbosity, 4)
-        ]
+        # ansible 2.19 dropped the play context verbosity
+        verbosity = getattr(self._play_context, "verbosity", display.verbosity)
+        log_level = ANSIBLE_VERBOSITY_TO_LOG_LEVEL[min(verbosity, 4)]
         if log_level != self._log_level:
             self._log_level = log_level
             logging.getLogger().setLevel(self._log_level)
@@ -214,6 +386,116 @@ class PersistentConnection(NetworkConnectionBase):
 
             logging.setLogRecordFactory(log_bridge)
 
+    def _start_profiler(self, profiler, directory, rpc_count, duration):
+        """Stop any running profiler and start a new one
+
+        :param profiler: The kind of profiler, cprofile or sampling
+        :type profiler: str
+        :param directory: The directory the output is written to
+        :type directory: str
+        :param rpc_count: Stop after this many RPCs, 0 for no limit
+        :type rpc_count: int
+        :param duration: Stop after this many seconds, 0 for no limit
+        :type duration: int
+        """
+        if self._profiler is not None:
+            self._profiler.stop()
+        self._profiler = RpcProfiler(
+            kind=profiler,
+            directory=directory,
+            rpc_count=rpc_count,
+            duration=duration,
+            interval=self.get_option("persistent_profile_interval"),
+        )
+        self._profiler.start()
+        msg = "Profiler started: {profiler}".format(profiler=profiler)
+        self._log_with_pid(msg=msg)()
+
+    def _arm_profiler(self):
+        """Start the profiler configured with the connection options
+
+        The options are sent with every task, the profiler is only started
+        in the persistent connection process and only when the
+        configuration changes, so a profiler that has finished is not restarted.
+        A profiler started by the options is stopped, writing its output,
+        when they no longer select one
+        """
+        if os.path.basename(sys.argv[0]) not in PERSISTENT_PROCESS_NAMES:
+            return
+        config = (
+            self.get_option("persistent_profiler"),
+            self.get_option("persistent_profile_dir"),
+            self.get_option("persistent_profile_rpc_count"),
+            self.get_option("persistent_profile_duration"),
+        )
+        if config == self._profiler_config:
+            return
+        previous, self._profiler_config = self._profiler_config, config
+        if config[0]:
+            self._start_profiler(*config)
+        elif previous and previous[0] and self._profiler is not None:
+            written = self._profiler.stop()
+            self._profiler = None
+            if written:
+                msg = "Profiler stopped, output written to {path}".format(
+                    path=written
+                )
+                self._log_with_pid(msg=msg)()
+
+    def profile(
+        self,
+        state="status",
+        profiler="cprofile",
+        directory=None,
+        rpc_count=0,
+        duration=0,
+    ):
+        """Control the profiler in the persistent connection process
+
+        from ansible.module_utils.connection import Connection
+
+        connection_proxy = Connection(self._connection._socket_path)
+        connection_proxy.profile(state="start", profiler="sampling", rpc_count=20)
+
+        :param state: start, stop or status
+        :type state: str
+        :param profiler: The kind of profiler, cprofile or sampling
+        :type profiler: str
+        :param directory: The directory the output is written to,
+            defaults to persistent_profile_dir
+        :type directory: str
+        :param rpc_count: Stop after this many RPCs, 0 for no limit
+        :type rpc_count: int
+        :param duration: Stop after this many seconds, 0 for no limit
+        :type duration: int
+        :return: The state of the profiler
+        :rtype: dict
+        """
+        if state == "start":
+            self._start_profiler(
+                profiler=profiler,
+                directory=directory
+                or self.get_option("persistent_profile_dir"),
+                rpc_count=rpc_count,
+                duration=duration,
+            )
+        elif state == "stop" and self._profiler is not None:
+            self._profiler.stop()
+        elif state not in ("start", "stop", "status"):
+            raise AnsibleConnectionFailure(
+                "Unknown profile state '{state}'".format(state=state)
+            )
+        if self._profiler is None:
+            return {"active": False}
+        return self._profiler.status()
+
+    def close(self):
+        """Write the output of a running profiler before closing"""
+        if self._profiler is not None:
+            self._profiler.stop()
+        super(PersistentConnection, self).close()
+
+    @profile_rpc
     @log_with_pid
     def set_options(self, task_keys=None, var_options=None, direct=None):
         """Handle inbound options, it is sent each time the Connection
@@ -224,7 +506,9 @@ class PersistentConnection(NetworkConnectionBase):
         super().set_options(
             task_keys=task_keys, var_options=var_options, direct=direct
         )
+        self._arm_profiler()
 
+    @profile_rpc
     @log_with_pid
     def update_play_context(self, pc_data):
         """Handle the inbound play context, it is sent each time the Connection
@@ -234,6 +518,9 @@ class PersistentConnection(NetworkConnectionBase):
         this remains here as an example of how and why processing the updated
         playbook context may be necessary
         """
+        from ansible.module_utils.six.moves import cPickle
+        from ansible.playbook.play_context import PlayContext
+
         pc_data = to_bytes(pc_data)
         if PY3:
             pc_data = cPickle.loads(pc_data, encoding="bytes")
@@ -278,6 +565,9 @@ class Connection(PersistentConnection):
         self._github = None
         self._connected = False
         self._gh_access_token = None
+        self._job_runner = None
+        self._keep_alive_stop = threading.Event()
+        self._shared_hosts = set()
 
     def ensure_current_token(func):
         """Wrapper to detect changes mid playbook of the GH access token
@@ -310,17 +600,15 @@ class Connection(PersistentConnection):
         if not self._connected:
             super(Connection, self)._connect()
             self._gh_access_token = self.get_option(option="gh_access_token")
-            if HAS_GITHUB:
-                self._github = Github(self._gh_access_token)
-            else:
-                raise AnsibleConnectionFailure(
-                    missing_required_lib("PyGithub").replace(
-                        "module", "connection"
-                    )
-                )
+            _import_github()
+            self._github = Github(
+                self._gh_access_token,
+                base_url=self.get_option(option="gh_base_url"),
+            )
             self._log_with_pid(msg="Github python library initialized")()
             self._connected = True
 
+    @PersistentConnection.profile_rpc
     @PersistentConnection.log_with_pid
     @ensure_current_token
     @ensure_connect
@@ -345,6 +633,7 @@ class Connection(PersistentConnection):
                 message="Connection error occured", orig_exc=exc
             )
 
+    @PersistentConnection.profile_rpc
     @PersistentConnection.log_with_pid
     @ensure_current_token
     @ensure_connect
@@ -370,3 +659,259 @@ class Connection(PersistentConnection):
             raise AnsibleConnectionFailure(
                 message="Connection error occured", orig_exc=exc
             )
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        """Share the connection across hosts when gh_share_connection is set"""
+        super(Connection, self).set_options(
+            task_keys=task_keys, var_options=var_options, direct=direct
+        )
+        if self.get_option("gh_share_connection"):
+            self._share_connection()
+
+    def _share_connection(self):
+        """Point the play context at the connection fingerprint
+
+        ansible-connection derives the socket path from the remote address,
+        port and user of the play context, with them replaced by the
+        fingerprint every host with the same endpoint and token uses the
+        same socket. In the persistent connection process the host is
+        counted until it resets the connection.
+        """
+        fingerprint = connection_fingerprint(
+            self.get_option("gh_base_url"), self.get_option("gh_access_token")
+        )
+        self._play_context.remote_addr = "github-{fingerprint}".format(
+            fingerprint=fingerprint
+        )
+        self._play_context.port = None
+        self._play_context.remote_user = None
+        host = self.get_option("gh_inventory_host")
+        if host and host not in self._shared_hosts:
+            self._shared_hosts.add(host)
+            msg = "Connection {fingerprint} shared with {host}, {count} host(s)".format(
+                fingerprint=fingerprint,
+                host=host,
+                count=len(self._shared_hosts),
+            )
+            self._log_with_pid(msg=msg)()
+
+    def _persistent_socket_path(self):
+        """The socket of the persistent connection process for the play
+        context, derived as ansible-connection derives it
+
+        :return: The socket path
+        :rtype: str
+        """
+        from ansible import constants as C
+        from ansible.plugins.loader import connection_loader
+        from ansible.utils.path import unfrackpath
+
+        control_path = connection_loader.get(
+            "ssh", class_only=True
+        )._create_control_path(
+            self._play_context.remote_addr,
+            self._play_context.port,
+            self._play_context.remote_user,
+            self._play_context.connection,
+            self._ansible_playbook_pid or os.getpid(),
+        )
+        return unfrackpath(
+            control_path
+            % dict(directory=unfrackpath(C.PERSISTENT_CONTROL_PATH_DIR))
+        )
+
+    def reset(self, host=None):
+        """Release a host from a shared connection, the connection is
+        closed once no host is using it
+
+        meta: reset_connection calls this in the controller, with the
+        options of the host, the reset is sent with the host to the
+        persistent connection process, if one is running
+
+        :param host: The host released, the connection is closed when
+            not given
+        :type host: str
+        """
+        shared = self.get_option("gh_share_connection")
+        if self._socket_path is None:
+            socket_path = self._persistent_socket_path()
+            if os.path.exists(socket_path):
+                from ansible.module_utils.connection import (
+                    Connection as RpcConnection,
+                )
+
+                RpcConnection(socket_path).reset(
+                    host=self.get_option("gh_inventory_host") if shared else None
+                )
+            return
+        if shared and host is not None:
+            self._shared_hosts.discard(host)
+            if self._shared_hosts:
+                msg = "Shared connection released by {host}, {count} host(s) remaining".format(
+                    host=host, count=len(self._shared_hosts)
+                )
+                self._log_with_pid(msg=msg)()
+                return
+        super(Connection, self).reset()
+
+    @property
+    def _jobs(self):
+        """The job runner, started with the first job"""
+        if self._job_runner is None:
+            self._job_runner = JobRunner(
+                workers=self.get_option("persistent_job_workers")
+            )
+            self._keep_alive_stop.clear()
+            keep_alive = threading.Thread(
+                target=self._keep_alive, name="keep_alive"
+            )
+            keep_alive.daemon = True
+            keep_alive.start()
+        return self._job_runner
+
+    def _keep_alive(self):
+        """Keep the persistent connection process running while jobs are
+        pending
+
+        ansible-connection shuts down when no socket is accepted within
+        persistent_connect_timeout, which would stop running jobs and
+        lose results not yet collected. While the runner has jobs and the
+        playbook is running, a socket is opened and closed again every
+        half timeout.
+        """
+        interval = max(self.get_option("persistent_connect_timeout") / 2.0, 1.0)
+        while not self._keep_alive_stop.wait(interval):
+            if self._ansible_playbook_pid:
+                try:
+                    os.kill(int(self._ansible_playbook_pid), 0)
+                except OSError:
+                    return
+            runner = self._job_runner
+            socket_path = self._socket_path
+            if runner is None or not socket_path or not runner.pending():
+                continue
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(interval)
+            try:
+                sock.connect(socket_path)
+            except (IOError, OSError):
+                pass
+            finally:
+                sock.close()
+
+    @PersistentConnection.profile_rpc
+    @PersistentConnection.log_with_pid
+    @ensure_current_token
+    @ensure_connect
+    def submit(
+        self,
+        method,
+        args=None,
+        kwargs=None,
+        label=None,
+        results_dir=None,
+        result_key="result",
+    ):
+        """Run indirect_method or direct_method as a background job
+        in the persistent connection process
+
+        from ansible.module_utils.connection import Connection
+
+        connection_proxy = Connection(self._connection._socket_path)
+        job_id = connection_proxy.submit(
+            "direct_method", kwargs={"org": "ansible-network"}
+        )
+        status = connection_proxy.poll(job_id)
+        status = connection_proxy.result(job_id)
+
+        With results_dir the job is collected as it finishes into a file
+        named for the job id, which async_status reads. The process is kept
+        running while jobs are pending, until the connection is closed or
+        the playbook ends
+
+        :param method: The method to run, one of JOB_METHODS
+        :type method: str
+        :param args: The positional arguments for the method
+        :type args: list
+        :param kwargs: The keyword arguments for the method
+        :type kwargs: dict
+        :param label: A label returned with the job status
+        :type label: str
+        :param results_dir: The async directory for async_status
+        :type results_dir: str
+        :param result_key: The key of the result in the results file
+        :type result_key: str
+        :return: The job id
+        :rtype: str
+        """
+        if method not in JOB_METHODS:
+            raise AnsibleConnectionFailure(
+                "Method '{method}' cannot be run as a job, expected one of: {methods}".format(
+                    method=method, methods=", ".join(JOB_METHODS)
+                )
+            )
+        # The job runs the method without profile_rpc, the profiler counts
+        # and is stopped on the thread serving RPCs, not on a job thread
+        func = partial(getattr(type(self), method).__wrapped__, self)
+        job_id = self._jobs.submit(
+            func,
+            args=args,
+            kwargs=kwargs,
+            label=label,
+            results_dir=results_dir,
+            result_key=result_key,
+        )
+        msg = "Job {job_id} submitted: {method}".format(
+            job_id=job_id, method=method
+        )
+        self._log_with_pid(msg=msg)()
+        return job_id
+
+    @PersistentConnection.log_with_pid
+    def poll(self, job_id):
+        """The status of a background job
+
+        :param job_id: The job id returned by submit
+        :type job_id: str
+        :return: The job id, label, state, finished and elapsed seconds
+        :rtype: dict
+        """
+        try:
+            return self._jobs.poll(job_id)
+        except KeyError as exc:
+            raise AnsibleConnectionFailure(exc.args[0])
+
+    @PersistentConnection.log_with_pid
+    def result(self, job_id):
+        """Collect the result of a background job if it has finished
+
+        The job is forgotten once its result or error is returned. This
+        does not wait for the job, ansible-connection serves one request
+        at a time, the caller waits between calls instead
+
+        :param job_id: The job id returned by submit
+        :type job_id: str
+        :return: The status, with result or msg once finished
+        :rtype: dict
+        """
+        try:
+            return self._jobs.result(job_id)
+        except KeyError as exc:
+            raise AnsibleConnectionFailure(exc.args[0])
+
+    def jobs(self):
+        """The status of every job not yet collected
+
+        :rtype: list
+        """
+        if self._job_runner is None:
+            return []
+        return self._job_runner.jobs()
+
+    def close(self):
+        """Cancel queued jobs before closing"""
+        self._keep_alive_stop.set()
+        if self._job_runner is not None:
+            self._job_runner.shutdown()
+            self._job_runner = None
+        super(Connection, self).close()
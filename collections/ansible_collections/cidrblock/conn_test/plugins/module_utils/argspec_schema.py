@@ -0,0 +1,745 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""The compiled schemas and cached results of argspec_validate
+
+Imported by argspec_validate on the first validation rather than with
+every plugin, ansible's collection loader compiles the source of a
+module_utils file each time it is imported.
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+
+from ansible_collections.cidrblock.conn_test.plugins.module_utils import (
+    argspec_validate,
+)
+from ansible_collections.cidrblock.conn_test.plugins.module_utils.utils import (
+    dict_merge,
+)
+from ansible.module_utils.six import iteritems
+
+# Values of exactly these types are cached, subclasses such as ansible's
+# tagged values are cached as their native type
+CACHEABLE_SCALARS = (str, int, float, bool, type(None))
+NATIVE_TYPES = (dict, list, tuple) + CACHEABLE_SCALARS
+TEMPLATE_MARKERS = ("{{", "{%")
+
+
+class _Uncacheable(Exception):
+    """Raised while building a cache key for data that cannot be cached"""
+
+
+def _templated(value):
+    """Whether ansible would template a string, ansible 2.19 templates
+    the strings trusted for templating, earlier versions all but unsafe
+    strings, outside the controller any string with a template is
+
+    :param value: The string
+    :type value: str
+    :rtype: bool
+    """
+    if not any(m in value for m in TEMPLATE_MARKERS):
+        return False
+    is_templated = globals().get("_is_templated")
+    if is_templated is None:
+        try:
+            from ansible.template import is_trusted_as_template as is_templated
+        except ImportError:
+            try:
+                from ansible.utils.unsafe_proxy import AnsibleUnsafe
+            except ImportError:
+                AnsibleUnsafe = ()
+
+            def is_templated(string):
+                return not isinstance(string, AnsibleUnsafe)
+
+        globals()["_is_templated"] = is_templated
+    return is_templated(value)
+
+
+def _native_type(value):
+    """The native type a subclass such as a tagged value derives from
+
+    :param value: The value
+    :return: One of NATIVE_TYPES or None
+    :rtype: type
+    """
+    for native in NATIVE_TYPES:
+        if isinstance(value, native):
+            return native
+    return None
+
+
+def _canonicalize(value):
+    """Convert data to a hashable, order independent equivalent
+
+    The native type is kept with each scalar so 1, 1.0 and True differ,
+    the tags of a value are not part of it
+
+    :param value: The data
+    :raises _Uncacheable: For other types or strings ansible would template
+    :return: The canonical form
+    :rtype: tuple
+    """
+    value_type = type(value)
+    if value_type is dict:
+        return (
+            "dict",
+            tuple(
+                sorted(
+                    (_canonicalize(k), _canonicalize(v))
+                    for k, v in iteritems(value)
+                )
+            ),
+        )
+    if value_type in (list, tuple):
+        return (value_type.__name__, tuple(_canonicalize(v) for v in value))
+    if value_type in CACHEABLE_SCALARS:
+        if value_type is str and _templated(value):
+            raise _Uncacheable()
+        return (value_type.__name__, value)
+    native = _native_type(value)
+    if native is None or (native is str and _templated(value)):
+        raise _Uncacheable()
+    if native in CACHEABLE_SCALARS:
+        return (native.__name__, native(value))
+    return _canonicalize(native(value))
+
+
+def _native(value):
+    """The data with subclasses such as tagged values converted to their
+    native type, the cache keeps no tags of the data it was given
+
+    :param value: The data
+    :return: The native data
+    """
+    value_type = type(value)
+    if value_type not in NATIVE_TYPES:
+        value_type = _native_type(value)
+        if value_type is None:
+            return value
+    if value_type is dict:
+        return dict((_native(k), _native(v)) for k, v in iteritems(value))
+    if value_type in (list, tuple):
+        return value_type(_native(v) for v in value)
+    return value if type(value) is value_type else value_type(value)
+
+
+class ValidationCache:
+    """A bounded LRU cache of validation results
+
+    The results are copied on the way in and the way out
+    so callers cannot change the cached copy
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        :param maxsize: The number of results kept
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return a copy of the cached result or None
+
+        :param key: The cache key
+        :type key: tuple
+        :return: valid, errors and validated parameters
+        :rtype: tuple or None
+        """
+        with self._lock:
+            try:
+                result = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return deepcopy(result)
+
+    def put(self, key, result):
+        """Cache a native copy of a result, evicting the least recently used
+
+        :param key: The cache key
+        :type key: tuple
+        :param result: valid, errors and validated parameters
+        :type result: tuple
+        """
+        result = deepcopy(_native(result))
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bypass(self):
+        """Count a validation that could not be cached"""
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.bypassed = self.evictions = 0
+
+    def stats(self):
+        """The cache counters
+
+        :return: size, hits, misses, bypassed, evictions and hit rate
+        :rtype: dict
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+VALIDATION_CACHE = ValidationCache()
+
+
+def _is_dict_list_spec(spec):
+    """An option that is a list of dicts with suboptions"""
+    return (
+        spec.get("type") == "list"
+        and spec.get("elements") == "dict"
+        and bool(spec.get("options"))
+    )
+
+
+# Suboptions using these are validated by the ArgumentSpecValidator alone
+UNCOMPILED_METADATA = ("fallback", "apply_defaults")
+
+
+class _Uncompilable(Exception):
+    """Raised for an argspec the CompiledSpec does not support"""
+
+
+class CompiledSpec:
+    def __init__(self, argument_spec, conditionals=None):
+        """An argspec prepared once for validating many dicts
+
+        The type checkers, choices, defaults and conditionals are looked up
+        once here rather than for every element. validate returns None for
+        anything it does not accept, the ArgumentSpecValidator then
+        validates that element and reports ansible's own error messages.
+
+        :param argument_spec: The argspec, eg the suboptions of a list
+        :type argument_spec: dict
+        :param conditionals: The conditionals for the argspec
+        :type conditionals: dict
+        :raises _Uncompilable: If the argspec uses fallback or apply_defaults
+        """
+        from ansible.module_utils.common import validation
+        from ansible.module_utils.common.parameters import (
+            DEFAULT_TYPE_VALIDATORS,
+        )
+
+        def checker(wanted):
+            if callable(wanted):
+                return wanted
+            try:
+                return DEFAULT_TYPE_VALIDATORS[wanted or "str"]
+            except KeyError:
+                raise _Uncompilable()
+
+        conditionals = conditionals or {}
+        # aliases are left to the ArgumentSpecValidator
+        self._names = frozenset(argument_spec)
+        self._mutually_exclusive = conditionals.get("mutually_exclusive")
+        self._check_mutually_exclusive = validation.check_mutually_exclusive
+        self._checks = [
+            (getattr(validation, "check_{0}".format(key)), conditionals[key])
+            for key in argspec_validate.OPTION_CONDITIONALS[1:]
+            if conditionals.get(key)
+        ]
+        self._defaults = []
+        self._required = []
+        self._options = []
+        self._choices = []
+        self._subspecs = []
+        for name, spec in iteritems(argument_spec):
+            if any(spec.get(key) for key in UNCOMPILED_METADATA):
+                raise _Uncompilable()
+            if spec.get("default") is not None:
+                self._defaults.append((name, spec["default"]))
+            if spec.get("required"):
+                self._required.append(name)
+            if spec.get("choices") is not None:
+                self._choices.append((name, spec["choices"]))
+            wanted = spec.get("type")
+            elements = spec.get("elements")
+            self._options.append(
+                (
+                    name,
+                    checker(wanted),
+                    checker(elements) if elements else None,
+                    bool(spec.get("required")),
+                    spec.get("default"),
+                )
+            )
+            if spec.get("options") and (
+                wanted == "dict" or (wanted == "list" and elements == "dict")
+            ):
+                self._subspecs.append(
+                    (
+                        name,
+                        CompiledSpec(
+                            spec["options"],
+                            dict(
+                                (key, spec[key])
+                                for key in argspec_validate.OPTION_CONDITIONALS
+                                if spec.get(key)
+                            ),
+                        ),
+                    )
+                )
+
+    def validate(self, element):
+        """Validate and convert a dict, in the order ansible does
+
+        :param element: The dict to validate
+        :type element: dict
+        :return: The dict updated with defaults, or None
+        :rtype: dict or None
+        """
+        if not isinstance(element, dict):
+            return None
+        names = self._names
+        for key in element:
+            if key not in names:
+                return None
+        params = dict(element)
+        try:
+            if self._mutually_exclusive:
+                self._check_mutually_exclusive(
+                    self._mutually_exclusive, params
+                )
+            for name, default in self._defaults:
+                if name not in params:
+                    params[name] = default
+            for name in self._required:
+                if name not in params:
+                    return None
+            for name, check, element_check, required, default in self._options:
+                if name not in params:
+                    continue
+                value = params[name]
+                if value is None and not required and default is None:
+                    continue
+                value = check(value)
+                if element_check is not None:
+                    if not isinstance(value, list):
+                        return None
+                    value = [element_check(item) for item in value]
+                params[name] = value
+            for name, choices in self._choices:
+                if name not in params:
+                    continue
+                value = params[name]
+                if isinstance(value, list):
+                    if any(item not in choices for item in value):
+                        return None
+                elif value not in choices:
+                    return None
+            for check, terms in self._checks:
+                check(terms, params)
+        except (TypeError, ValueError):
+            return None
+        for name, _check, _element_check, _required, default in self._options:
+            if name not in params:
+                params[name] = default
+        for name, subspec in self._subspecs:
+            value = params[name]
+            if value is None:
+                continue
+            if isinstance(value, dict):
+                value = subspec.validate(value)
+            else:
+                value = [subspec.validate(item) for item in value]
+                if None in value:
+                    return None
+            if value is None:
+                return None
+            params[name] = value
+        return params
+
+
+class ListElementValidator:
+    def __init__(self, spec, path, name=None):
+        """Validate the elements of a list of dicts against its suboptions
+
+        The suboptions are compiled once and reused for every element,
+        elements the CompiledSpec does not accept are revalidated by an
+        ArgumentSpecValidator, also built once, for its error messages.
+        Elements are validated a chunk at a time, on the MonkeyModule path
+        a chunk is validated with a single AnsibleModule and only
+        revalidated per element to locate errors.
+
+        :param spec: The argspec of the list option, including its options
+            and conditionals
+        :type spec: dict
+        :param path: The JSON path of the list, eg $.operands
+        :type path: str
+        :param name: the name of the plugin, used in error messages
+        :type name: str
+        """
+        self._path = path
+        self._name = name
+        conditionals = dict(
+            (key, spec[key])
+            for key in argspec_validate.OPTION_CONDITIONALS
+            if spec.get(key)
+        )
+        self._argument_spec = spec["options"]
+        self._conditionals = conditionals
+        self._compiled = None
+        self._validator = None
+        if argspec_validate.HAS_ANSIBLE_ARG_SPEC_VALIDATOR:
+            from ansible.module_utils.common.arg_spec import (
+                ArgumentSpecValidator,
+            )
+
+            self._validator = ArgumentSpecValidator(
+                self._argument_spec, **conditionals
+            )
+            try:
+                self._compiled = CompiledSpec(
+                    self._argument_spec, conditionals
+                )
+            except _Uncompilable:
+                pass
+
+    def _validate_element(self, element):
+        """Validate a single element
+
+        :param element: The element
+        :type element: dict
+        :return: The errors and the element updated with defaults
+        :rtype: tuple
+        """
+        if not isinstance(element, dict):
+            from ansible.module_utils.common.validation import (
+                check_type_dict,
+            )
+
+            try:
+                element = check_type_dict(element)
+            except TypeError as exc:
+                return ["elements must be dict: {err}".format(err=exc)], None
+        if self._compiled is not None:
+            params = self._compiled.validate(element)
+            if params is not None:
+                return [], params
+        if self._validator is not None:
+            result = self._validator.validate(element)
+            return result.error_messages, result.validated_parameters
+        schema = dict(self._conditionals, argument_spec=self._argument_spec)
+        valid, errors, params = argspec_validate._monkey_module()(
+            data=dict(element), schema=schema, name=self._name
+        ).validate()
+        return ([] if valid else [errors]), params
+
+    def _validate_chunk_monkey(self, chunk):
+        """Validate a chunk with a single AnsibleModule
+
+        :return: The validated elements, or None if the chunk has errors
+        :rtype: list or None
+        """
+        option = dict(
+            self._conditionals,
+            type="list",
+            elements="dict",
+            options=self._argument_spec,
+        )
+        valid, _errors, params = argspec_validate._monkey_module()(
+            data={"elements": list(chunk)},
+            schema={"argument_spec": {"elements": option}},
+            name=self._name,
+        ).validate()
+        return params["elements"] if valid else None
+
+    def validate(self, elements, chunk_size, errors, max_errors):
+        """Validate the elements chunk by chunk
+
+        Validation stops once max_errors errors have been collected
+
+        :param elements: The list of elements
+        :type elements: list
+        :param chunk_size: The number of elements per chunk
+        :type chunk_size: int
+        :param errors: The errors so far, appended to
+        :type errors: list
+        :param max_errors: The most errors collected
+        :type max_errors: int
+        :return: The validated elements and if validation completed
+        :rtype: tuple
+        """
+        validated = []
+        for start in range(0, len(elements), chunk_size):
+            chunk = elements[start : start + chunk_size]
+            if self._validator is None:
+                params = self._validate_chunk_monkey(chunk)
+                if params is not None:
+                    validated.extend(params)
+                    continue
+            for idx, element in enumerate(chunk, start):
+                messages, params = self._validate_element(element)
+                for message in messages:
+                    if len(errors) >= max_errors:
+                        return validated, False
+                    errors.append(
+                        "{path}[{idx}]: {msg}".format(
+                            path=self._path, idx=idx, msg=message
+                        )
+                    )
+                validated.append(params)
+        return validated, True
+
+
+class CompiledSchema:
+    def __init__(self, schema, conditionals=None, other_args=None):
+        """A schema prepared once for validating many tasks
+
+        The doc is parsed and the conditionals merged once, the
+        ArgumentSpecValidator and the validators of large lists are built
+        on first use and kept. Everything here is shared by every caller
+        and is not changed after it is built.
+
+        :param schema: The schema in ansible argspec format
+        :type schema: dict
+        :param conditionals: A dict of schema conditionals, ie required_if
+        :type conditionals: dict
+        :param other_args: Other valid kv pairs for the argspec
+        :type other_args: dict
+        """
+        self._schema = schema
+        self._schema_conditionals = conditionals
+        self._other_args = other_args
+        self._module_args = None
+        # the ArgumentSpecValidator path, nested conditionals are
+        # merged into the argspec
+        self.conditionals = dict(conditionals or {})
+        self.argument_spec = schema["argument_spec"]
+        nested = self.conditionals.pop("argument_spec", None)
+        if nested:
+            self.argument_spec = dict_merge(self.argument_spec, nested)
+        self._validator = None
+        self._list_validators = {}
+        self._lock = threading.Lock()
+
+    @property
+    def module_args(self):
+        """The arguments for the MonkeyModule's AnsibleModule, which
+        is given a copy, built on first use
+        """
+        if self._module_args is None:
+            module_args = self._schema
+            if self._schema_conditionals is not None:
+                module_args = dict_merge(module_args, self._schema_conditionals)
+            if self._other_args is not None:
+                module_args = dict_merge(module_args, self._other_args)
+            self._module_args = module_args
+        return self._module_args
+
+    @property
+    def invalid_keys(self):
+        """The keys of the module args AnsibleModule does not accept"""
+        return [
+            k
+            for k in self.module_args
+            if k not in argspec_validate.VALID_ANSIBLEMODULE_ARGS
+        ]
+
+    @property
+    def validator(self):
+        """The ArgumentSpecValidator, built on first use"""
+        if self._validator is None:
+            from ansible.module_utils.common.arg_spec import (
+                ArgumentSpecValidator,
+            )
+
+            self._validator = ArgumentSpecValidator(
+                self.argument_spec, **self.conditionals
+            )
+        return self._validator
+
+    def list_validator(self, key, path, name=None):
+        """The validator for the elements of a list of dicts, built on
+        first use
+
+        :param key: The option in the argspec
+        :type key: str
+        :param path: The JSON path of the list, eg $.operands
+        :type path: str
+        :param name: the name of the plugin, used in error messages
+        :type name: str
+        :rtype: ListElementValidator
+        """
+        vkey = (
+            key,
+            path,
+            name,
+            argspec_validate.HAS_ANSIBLE_ARG_SPEC_VALIDATOR,
+        )
+        validator = self._list_validators.get(vkey)
+        if validator is None:
+            validator = ListElementValidator(
+                self.argument_spec[key], path=path, name=name
+            )
+            with self._lock:
+                self._list_validators[vkey] = validator
+        return validator
+
+    def warm(self, name=None):
+        """Build everything built on first use, eg before forking
+
+        :param name: the name of the plugin, used in error messages
+        :type name: str
+        """
+        if argspec_validate.HAS_ANSIBLE_ARG_SPEC_VALIDATOR:
+            self.validator
+        else:
+            self.module_args
+        for key, spec in iteritems(self.argument_spec):
+            if _is_dict_list_spec(spec):
+                self.list_validator(key, "$.{key}".format(key=key), name)
+
+
+class SchemaRegistry:
+    """The compiled schemas of this process by schema and conditionals
+
+    A forked worker inherits the schemas compiled before the fork, see
+    plugin_utils/prefork.py
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        :param maxsize: The number of schemas kept
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(schema, schema_format, conditionals=None, other_args=None):
+        """The identity of a schema as a hashable key, only docs are kept,
+        building the key for an argspec costs as much as compiling it
+
+        :return: The key or None if the schema cannot be kept
+        :rtype: tuple or None
+        """
+        if type(schema) is not str:
+            return None
+        try:
+            return (
+                schema,
+                schema_format,
+                _canonicalize(conditionals),
+                _canonicalize(other_args),
+            )
+        except _Uncacheable:
+            return None
+
+    def get(self, key):
+        """The compiled schema or None
+
+        :param key: The key
+        :type key: tuple
+        :rtype: CompiledSchema or None
+        """
+        with self._lock:
+            try:
+                compiled = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return compiled
+
+    def put(self, key, compiled):
+        """Keep a compiled schema, dropping the least recently used
+
+        :param key: The key
+        :type key: tuple
+        :param compiled: The compiled schema
+        :type compiled: CompiledSchema
+        """
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def compile(
+        self,
+        schema,
+        schema_format="doc",
+        schema_conditionals=None,
+        other_args=None,
+        name=None,
+    ):
+        """Compile a schema into the registry and build its validators
+
+        :param name: the name of the plugin, used in error messages
+        :type name: str
+        :raises DocFragmentError: If a doc fragment cannot be resolved
+        :return: The compiled schema
+        :rtype: CompiledSchema
+        """
+        compiled = argspec_validate.AnsibleArgSpecValidator(
+            data={},
+            schema=schema,
+            schema_format=schema_format,
+            schema_conditionals=schema_conditionals,
+            other_args=other_args,
+            name=name,
+        )._compiled()
+        compiled.warm(name)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """The registry counters
+
+        :return: size, hits and misses
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+SCHEMA_REGISTRY = SchemaRegistry()
@@ -23,29 +23,20 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 
-import re
-from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.cidrblock.conn_test.plugins.module_utils.utils import (
-    dict_merge,
-)
+from copy import deepcopy
+from importlib.util import find_spec
+
 from ansible.module_utils.six import iteritems
 
-try:
-    import yaml
-
-    # use C version if possible for speedup
-    try:
-        from yaml import CSafeLoader as SafeLoader
-    except ImportError:
-        from yaml import SafeLoader
-    HAS_YAML = True
-except ImportError:
-    HAS_YAML = False
+# AnsibleModule, yaml, the ArgumentSpecValidator and argspec_schema are
+# imported on first use, every worker and ansible-connection imports this
+# file with the plugins
+HAS_YAML = find_spec("yaml") is not None
 
 try:
-    from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
-
-    HAS_ANSIBLE_ARG_SPEC_VALIDATOR = True
+    HAS_ANSIBLE_ARG_SPEC_VALIDATOR = (
+        find_spec("ansible.module_utils.common.arg_spec") is not None
+    )
 except ImportError:
     HAS_ANSIBLE_ARG_SPEC_VALIDATOR = False
 
@@ -82,49 +73,124 @@ VALID_ANSIBLEMODULE_ARGS = (
 BASE_ARG_AVAIL = 2.11
 
 
-class MonkeyModule(AnsibleModule):
-    """A derivative of the AnsibleModule used
-    to just validate the data (task.args) against
-    the schema(argspec)
+def _load_yaml(stream):
+    """Load yaml, importing the C loader if possible for speedup"""
+    import yaml
+
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+    return yaml.load(stream, SafeLoader)
+
+
+def _define_monkey_module():
+    """Define the MonkeyModule, AnsibleModule is imported here rather than
+    when this file is imported
     """
+    import re
 
-    def __init__(self, data, schema, name):
-        self._errors = None
-        self._valid = True
-        self._schema = schema
-        self.name = name
-        self.params = data
+    from ansible.module_utils.basic import AnsibleModule
 
-    def fail_json(self, msg):
-        """Replace the AnsibleModule fail_json here
-        :param msg: The message for the failure
-        :type msg: str
+    class MonkeyModule(AnsibleModule):
+        """A derivative of the AnsibleModule used
+        to just validate the data (task.args) against
+        the schema(argspec)
         """
-        if self.name:
-            msg = re.sub(
-                r"\(basic\.pyc?\)", "'{name}'".format(name=self.name), msg
-            )
-        self._valid = False
-        self._errors = msg
 
-    def _load_params(self):
-        """This replaces the AnsibleModule _load_params
-        fn because we already set self.params in init
-        """
-        pass
+        def __init__(self, data, schema, name):
+            self._errors = None
+            self._valid = True
+            self._schema = schema
+            self.name = name
+            self.params = data
 
-    def validate(self):
-        """Instantiate the super, validating the schema
-        against the data
-        :return valid: if the data passed
-        :rtype valid: bool
-        :return errors: errors reported during validation
-        :rtype errors: str
-        :return params: The original data updated with defaults
-        :rtype params: dict
-        """
-        super(MonkeyModule, self).__init__(**self._schema)
-        return self._valid, self._errors, self.params
+        def fail_json(self, msg):
+            """Replace the AnsibleModule fail_json here
+            :param msg: The message for the failure
+            :type msg: str
+            """
+            if self.name:
+                msg = re.sub(
+                    r"\(basic\.pyc?\)",
+                    "'{name}'".format(name=self.name),
+                    msg,
+                )
+            self._valid = False
+            self._errors = msg
+
+        def _load_params(self):
+            """This replaces the AnsibleModule _load_params
+            fn because we already set self.params in init
+            """
+            pass
+
+        def validate(self):
+            """Instantiate the super, validating the schema
+            against the data
+            :return valid: if the data passed
+            :rtype valid: bool
+            :return errors: errors reported during validation
+            :rtype errors: str
+            :return params: The original data updated with defaults
+            :rtype params: dict
+            """
+            super(MonkeyModule, self).__init__(**self._schema)
+            return self._valid, self._errors, self.params
+
+    return MonkeyModule
+
+
+def _monkey_module():
+    """The MonkeyModule class, defined on first use"""
+    cls = globals().get("MonkeyModule")
+    if cls is None:
+        cls = globals()["MonkeyModule"] = _define_monkey_module()
+    return cls
+
+
+def _argspec_schema():
+    """The argspec_schema module, with the compiled schemas and cached
+    results, imported on first use
+    """
+    module = globals().get("_schema_module")
+    if module is None:
+        from ansible_collections.cidrblock.conn_test.plugins.module_utils import (
+            argspec_schema as module,
+        )
+
+        globals()["_schema_module"] = module
+    return module
+
+
+# Defined in argspec_schema, available here as they were before it
+SCHEMA_NAMES = (
+    "VALIDATION_CACHE",
+    "ValidationCache",
+    "SCHEMA_REGISTRY",
+    "SchemaRegistry",
+    "CompiledSchema",
+)
+
+
+def __getattr__(name):
+    """Define MonkeyModule or import argspec_schema on first access
+    from outside this file
+    """
+    if name == "MonkeyModule":
+        return _monkey_module()
+    if name in SCHEMA_NAMES:
+        return getattr(_argspec_schema(), name)
+    raise AttributeError(
+        "module {mod!r} has no attribute {name!r}".format(
+            mod=__name__, name=name
+        )
+    )
+
+
+# The large list mode, elements validated per chunk and the errors reported
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_MAX_ERRORS = 100
 
 
 class AnsibleArgSpecValidator:
@@ -136,6 +202,9 @@ class AnsibleArgSpecValidator:
         schema_conditionals=None,
         name=None,
         other_args=None,
+        memoize=False,
+        chunk_size=None,
+        max_errors=DEFAULT_MAX_ERRORS,
     ):
         """Validate some data against a schema
         :param data: The data to valdiate
@@ -150,11 +219,23 @@ class AnsibleArgSpecValidator:
         :type name: str
         :param other_args: Other valid kv pairs for the argspec, eg no_log, bypass_checks
         :type other_args: dict
+        :param memoize: Return the cached result for identical data and schema
+            from argspec_schema.VALIDATION_CACHE
+        :type memoize: bool
+        :param chunk_size: Validate the elements of lists of dicts with
+            suboptions this many at a time, for large payloads
+        :type chunk_size: int
+        :param max_errors: The most errors reported when chunk_size is set,
+            each located with a JSON path, eg $.operands[12]
+        :type max_errors: int
 
         note:
         - the schema conditionals can be root conditionals or deeply nested conditionals
           these get dict_merged into the argspec from the docstring, since the docstring cannot
           contain them.
+        - data containing other than dicts, lists, strings, numbers, bools and None,
+          or strings ansible would template, is not memoized, tagged values are
+          memoized as their native type
         """
         self._errors = ""
         self._name = name
@@ -163,6 +244,10 @@ class AnsibleArgSpecValidator:
         self._schema_format = schema_format
         self._schema_conditionals = schema_conditionals
         self._data = data
+        self._memoize = memoize
+        self._chunk_size = chunk_size
+        self._max_errors = max_errors
+        self._compiled_schema = None
 
     def _extract_schema_from_doc(self, doc_obj, temp_schema):
         """Extract the schema from a doc string
@@ -184,20 +269,60 @@ class AnsibleArgSpecValidator:
                 elif metakey in OPTION_METADATA + OPTION_CONDITIONALS:
                     temp_schema[okey].update({metakey: ovalue[metakey]})
 
-    # TODO: Support extends_documentation_fragment
     def _convert_doc_to_schema(self):
         """Convert the doc string to an obj, was yaml
+        merge in the extended documentation fragments
         add back other valid conditionals and params
+
+        :return: The schema in ansible argspec format
+        :rtype: dict
         """
-        doc_obj = yaml.load(self._schema, SafeLoader)
+        from ansible_collections.cidrblock.conn_test.plugins.module_utils.doc_fragments import (
+            FRAGMENT_INDEX,
+        )
+
+        doc_obj = FRAGMENT_INDEX.extend(_load_yaml(self._schema))
         temp_schema = {}
         self._extract_schema_from_doc(doc_obj, temp_schema)
-        self._schema = {"argument_spec": temp_schema}
+        return {"argument_spec": temp_schema}
+
+    def _compiled(self):
+        """The compiled schema from argspec_schema.SCHEMA_REGISTRY, compiled
+        on first use
 
-    def _validate(self):
+        :rtype: CompiledSchema
+        """
+        if self._compiled_schema is not None:
+            return self._compiled_schema
+        schema_module = _argspec_schema()
+        registry = schema_module.SCHEMA_REGISTRY
+        key = registry.key(
+            self._schema,
+            self._schema_format,
+            self._schema_conditionals,
+            self._other_args,
+        )
+        compiled = registry.get(key) if key is not None else None
+        if compiled is None:
+            schema = self._schema
+            if self._schema_format == "doc":
+                schema = self._convert_doc_to_schema()
+            compiled = schema_module.CompiledSchema(
+                schema, self._schema_conditionals, self._other_args
+            )
+            if key is not None:
+                registry.put(key, compiled)
+        self._compiled_schema = compiled
+        return compiled
+
+    def _validate(self, data=None, compiled=None):
         """Validate the data gainst the schema
         convert doc string in argspec if necessary
 
+        :param data: The data, when not the data given
+        :type data: dict
+        :param compiled: The compiled schema, when already compiled
+        :type compiled: CompiledSchema
         :return valid: if the data passed
         :rtype valid: bool
         :return errors: errors reported during validation
@@ -205,43 +330,147 @@ class AnsibleArgSpecValidator:
         :return params: The original data updated with defaults
         :rtype params: dict
         """
-        if self._schema_format == "doc":
-            self._convert_doc_to_schema()
-        if self._schema_conditionals is not None:
-            self._schema = dict_merge(self._schema, self._schema_conditionals)
-        if self._other_args is not None:
-            self._schema = dict_merge(self._schema, self._other_args)
-        invalid_keys = [
-            k for k in self._schema.keys() if k not in VALID_ANSIBLEMODULE_ARGS
-        ]
-        if invalid_keys:
+        if compiled is None:
+            compiled = self._compiled()
+        if compiled.invalid_keys:
             valid = False
             errors = "Invalid schema. Invalid keys found: {ikeys}".format(
-                ikeys=",".join(invalid_keys)
+                ikeys=",".join(compiled.invalid_keys)
             )
             updated_data = {}
         else:
-            mm = MonkeyModule(
-                data=self._data, schema=self._schema, name=self._name
+            mm = _monkey_module()(
+                data=self._data if data is None else data,
+                schema=deepcopy(compiled.module_args),
+                name=self._name,
             )
             valid, errors, updated_data = mm.validate()
         return valid, errors, updated_data
 
+    def _cache_key(self):
+        """The data and the identity of the schema as a hashable key
+
+        :return: The key or None if the data cannot be cached
+        :rtype: tuple or None
+        """
+        schema_module = _argspec_schema()
+        canonicalize = schema_module._canonicalize
+        try:
+            return (
+                canonicalize(self._data),
+                self._schema
+                if type(self._schema) is str
+                else canonicalize(self._schema),
+                self._schema_format,
+                canonicalize(self._schema_conditionals),
+                canonicalize(self._other_args),
+                self._name,
+                self._chunk_size,
+                self._max_errors,
+                HAS_ANSIBLE_ARG_SPEC_VALIDATOR,
+            )
+        except schema_module._Uncacheable:
+            return None
+
     def validate(self):
         """The public validate method
-        check for future argspec validation
+        memoized when requested
+        """
+        if not self._memoize:
+            return self._validate_uncached()
+        cache = _argspec_schema().VALIDATION_CACHE
+        key = self._cache_key()
+        if key is None:
+            cache.bypass()
+            return self._validate_uncached()
+        result = cache.get(key)
+        if result is None:
+            result = self._validate_uncached()
+            cache.put(key, result)
+        return result
+
+    def _validate_uncached(self):
+        """Check for future argspec validation
         that is coming in 2.11, change the check according above
         """
+        from ansible_collections.cidrblock.conn_test.plugins.module_utils.doc_fragments import (
+            DocFragmentError,
+        )
+
+        try:
+            return self._validate_with_validator()
+        except DocFragmentError as exc:
+            return False, "Invalid schema. {err}".format(err=exc), {}
+
+    def _validate_chunked(self):
+        """Validate lists of dicts with suboptions chunk by chunk
+        and everything else as usual
+
+        The lists are replaced with empty lists for the top level
+        validation, so conditionals referring to them still hold
+
+        :return valid: if the data passed
+        :rtype valid: bool
+        :return errors: errors reported during validation
+        :rtype errors: list
+        :return params: The original data updated with defaults
+        :rtype params: dict
+        """
+        compiled = self._compiled()
+        argument_spec = compiled.argument_spec
+        data = dict(self._data)
+        lists = []
+        for key, spec in iteritems(argument_spec):
+            if not _argspec_schema()._is_dict_list_spec(spec):
+                continue
+            for name in (key,) + tuple(spec.get("aliases") or ()):
+                if isinstance(data.get(name), list):
+                    lists.append((key, name, data[name]))
+                    data[name] = []
+                    break
+
+        valid, errors, params = self._validate_unchunked(compiled, data)
+        if isinstance(errors, str):
+            errors = [errors]
+        errors = list(errors or [])[: self._max_errors]
+
+        completed = len(errors) < self._max_errors or not lists
+        for key, name, elements in lists:
+            if not completed:
+                break
+            validator = compiled.list_validator(
+                key, path="$.{name}".format(name=name), name=self._name
+            )
+            validated, completed = validator.validate(
+                elements, self._chunk_size, errors, self._max_errors
+            )
+            params[key] = validated
+            if name in params:
+                params[name] = validated
+        if not completed:
+            errors.append(
+                "Validation stopped after {count} errors".format(
+                    count=self._max_errors
+                )
+            )
+        return not errors, errors, params
+
+    def _validate_with_validator(self):
+        """Use the ArgumentSpecValidator if available
+        or fall back to the MonkeyModule
+        """
+        if self._chunk_size:
+            return self._validate_chunked()
+        return self._validate_unchunked(self._compiled(), self._data)
+
+    def _validate_unchunked(self, compiled, data):
+        """Validate the data against the compiled schema"""
         if HAS_ANSIBLE_ARG_SPEC_VALIDATOR:
-            if self._schema_format == "doc":
-                self._convert_doc_to_schema()
-            conditionals = self._schema_conditionals or {}
-            validator = ArgumentSpecValidator(self._schema['argument_spec'], **conditionals)
-            result = validator.validate(self._data)
+            result = compiled.validator.validate(data)
             valid = not bool(result.error_messages)
             return valid, result.error_messages, result.validated_parameters
         else:
-            return self._validate()
+            return self._validate(data, compiled)
 
 
 def check_argspec(
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Resolve extends_documentation_fragment without the plugin loader
+
+The doc_fragments directories of ansible and of every collection in the
+collection paths are indexed once per process, each fragment is parsed
+once and cached, so validating many tasks against a doc that extends a
+large fragment only pays for the merge.
+
+doc = _load_yaml(DOCUMENTATION)
+doc = FRAGMENT_INDEX.extend(doc)
+
+Fragment names follow ansible, a short name is an ansible fragment, a
+fully qualified name is a collection fragment and an extra dotted part
+selects a variable other than DOCUMENTATION, eg
+cidrblock.conn_test.network.PROVIDER
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import ast
+import glob
+import importlib
+import os
+import threading
+from copy import deepcopy
+
+from ansible_collections.cidrblock.conn_test.plugins.module_utils.argspec_validate import (
+    _load_yaml,
+)
+from ansible.module_utils.six import iteritems, string_types
+
+FRAGMENT_CLASS = "ModuleDocFragment"
+FRAGMENT_VAR = "DOCUMENTATION"
+BUILTIN_COLLECTION = "ansible.builtin"
+
+# plugins/module_utils/doc_fragments.py -> the directory holding
+# ansible_collections, used when no collection finder is configured
+_OWN_ROOT = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), *[os.pardir] * 5)
+)
+
+
+class DocFragmentError(Exception):
+    """Raised when a fragment cannot be found or is invalid"""
+
+
+def _collection_roots():
+    """The collection paths, as directories containing ansible_collections
+
+    :return: The paths, in the collection finder's order
+    :rtype: list
+    """
+    paths = []
+    try:
+        from ansible.utils.collection_loader import AnsibleCollectionConfig
+
+        paths.extend(AnsibleCollectionConfig.collection_paths)
+    except (ImportError, NotImplementedError):
+        pass
+    paths.append(_OWN_ROOT)
+    roots = []
+    for path in paths:
+        if os.path.basename(path) == "ansible_collections":
+            path = os.path.dirname(path)
+        if path not in roots:
+            roots.append(path)
+    return roots
+
+
+def _builtin_fragments_dir():
+    import ansible
+
+    return os.path.join(
+        os.path.dirname(ansible.__file__), "plugins", "doc_fragments"
+    )
+
+
+def _read_fragment_vars(path):
+    """Read the string variables of the fragment class without importing it
+
+    :param path: The path of the fragment file
+    :type path: str
+    :return: The variables assigned a literal string, by name
+    :rtype: dict
+    """
+    with open(path, "rb") as fhand:
+        tree = ast.parse(fhand.read(), filename=path)
+    variables = {}
+    for node in tree.body:
+        if not (isinstance(node, ast.ClassDef) and node.name == FRAGMENT_CLASS):
+            continue
+        for stmt in node.body:
+            if not isinstance(stmt, ast.Assign):
+                continue
+            if not (
+                isinstance(stmt.value, ast.Constant)
+                and isinstance(stmt.value.value, str)
+            ):
+                continue
+            for target in stmt.targets:
+                if isinstance(target, ast.Name):
+                    variables[target.id] = stmt.value.value
+    return variables
+
+
+class DocFragmentIndex:
+    """The doc fragments available to this process and their parsed content"""
+
+    def __init__(self):
+        self._files = None
+        self._parsed = {}
+        self._lock = threading.Lock()
+
+    def _build(self):
+        """Index the fragment files, the first collection path wins
+
+        :return: The fragment files by fully qualified name
+        :rtype: dict
+        """
+        files = {}
+        builtin = _builtin_fragments_dir()
+        for path in glob.glob(os.path.join(builtin, "*.py")):
+            name = os.path.basename(path)[:-3]
+            if name != "__init__":
+                files["{0}.{1}".format(BUILTIN_COLLECTION, name)] = path
+        for root in _collection_roots():
+            pattern = os.path.join(
+                root,
+                "ansible_collections",
+                "*",
+                "*",
+                "plugins",
+                "doc_fragments",
+                "*.py",
+            )
+            for path in sorted(glob.glob(pattern)):
+                parts = path[:-3].split(os.sep)
+                if parts[-1] == "__init__":
+                    continue
+                name = ".".join((parts[-5], parts[-4], parts[-1]))
+                files.setdefault(name, path)
+        return files
+
+    @property
+    def files(self):
+        """The fragment files by fully qualified name, indexed on first use"""
+        if self._files is None:
+            with self._lock:
+                if self._files is None:
+                    self._files = self._build()
+        return self._files
+
+    def clear(self):
+        """Drop the index and the parsed fragments, eg after the
+        collection paths change
+        """
+        with self._lock:
+            self._files = None
+            self._parsed.clear()
+
+    def _qualify(self, name):
+        """The fully qualified name of a fragment, ansible's short
+        names are in ansible.builtin
+        """
+        if name.count(".") < 2:
+            return "{0}.{1}".format(BUILTIN_COLLECTION, name)
+        return name
+
+    def _resolve(self, slug):
+        """Split a fragment reference into its file and variable,
+        the fragment is tried as named before treating the last part
+        as the variable
+
+        :param slug: The entry from extends_documentation_fragment
+        :type slug: str
+        :return: The fully qualified name, the file and the variable
+        :rtype: tuple
+        """
+        name = self._qualify(slug)
+        path = self.files.get(name)
+        if path is not None:
+            return name, path, FRAGMENT_VAR
+        if "." in slug:
+            short, var = slug.rsplit(".", 1)
+            name = self._qualify(short)
+            path = self.files.get(name)
+            if path is not None:
+                return name, path, var.upper()
+        raise DocFragmentError(
+            "Documentation fragment '{slug}' not found".format(slug=slug)
+        )
+
+    def _import_var(self, name, var):
+        """Import the fragment for a variable that is not a literal string"""
+        namespace, collection, fragment = name.split(".")
+        if "{0}.{1}".format(namespace, collection) == BUILTIN_COLLECTION:
+            module = "ansible.plugins.doc_fragments.{0}".format(fragment)
+        else:
+            module = "ansible_collections.{0}.{1}.plugins.doc_fragments.{2}".format(
+                namespace, collection, fragment
+            )
+        try:
+            fragment_class = getattr(
+                importlib.import_module(module), FRAGMENT_CLASS
+            )
+        except (ImportError, AttributeError):
+            return None
+        return getattr(fragment_class, var, None)
+
+    def get(self, slug):
+        """The parsed fragment, shared by every caller so it is
+        not to be changed
+
+        :param slug: The entry from extends_documentation_fragment
+        :type slug: str
+        :raises DocFragmentError: If the fragment cannot be found or parsed
+        :return: The fragment
+        :rtype: dict
+        """
+        slug = slug.strip()
+        fragment = self._parsed.get(slug)
+        if fragment is not None:
+            return fragment
+        name, path, var = self._resolve(slug)
+        try:
+            source = _read_fragment_vars(path).get(var)
+        except (IOError, OSError, SyntaxError) as exc:
+            raise DocFragmentError(
+                "Unable to read documentation fragment '{slug}': {err}".format(
+                    slug=slug, err=exc
+                )
+            )
+        if source is None:
+            source = self._import_var(name, var)
+        if source is None:
+            raise DocFragmentError(
+                "Documentation fragment '{slug}' has no {var}".format(
+                    slug=slug, var=var
+                )
+            )
+        fragment = _load_yaml(source) or {}
+        if not isinstance(fragment, dict):
+            raise DocFragmentError(
+                "Documentation fragment '{slug}' is not a dictionary".format(
+                    slug=slug
+                )
+            )
+        with self._lock:
+            self._parsed[slug] = fragment
+        return fragment
+
+    def extend(self, doc):
+        """Merge the fragments named in extends_documentation_fragment
+        into the doc, options in the doc take precedence over the
+        fragment's as they do in ansible
+
+        :param doc: The doc as a python obj, it is changed
+        :type doc: dict
+        :raises DocFragmentError: If a fragment cannot be resolved
+        :return: The doc without extends_documentation_fragment
+        :rtype: dict
+        """
+        slugs = doc.pop("extends_documentation_fragment", None) or []
+        if isinstance(slugs, string_types):
+            slugs = slugs.split(",")
+        for slug in slugs:
+            fragment = self.get(slug)
+            options = doc.setdefault("options", {})
+            if options is None:
+                options = doc["options"] = {}
+            for okey, ovalue in iteritems(fragment.get("options") or {}):
+                merged = deepcopy(ovalue)
+                if okey in options:
+                    merged.update(options[okey])
+                options[okey] = merged
+        return doc
+
+
+FRAGMENT_INDEX = DocFragmentIndex()
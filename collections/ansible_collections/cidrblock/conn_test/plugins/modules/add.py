@@ -20,16 +20,16 @@ options:
   first:
     description:
       - The first number
+      - Required unless I(operands) is provided.
     type: float
-    required: True
   second:
     choices:
     - 10
     - 20
     description:
       - The second number
+      - Required unless I(operands) is provided.
     type: float
-    required: True
   third:
     description:
       - The third number
@@ -38,6 +38,34 @@ options:
     description:
       - The fourth number
     type: float
+  operands:
+    description:
+      - Add many sets of numbers in a single task rather than looping over the task.
+      - Mutually exclusive with I(first), I(second), I(third) and I(fourth).
+    type: list
+    elements: dict
+    suboptions:
+      first:
+        description:
+          - The first number
+        type: float
+        required: True
+      second:
+        choices:
+        - 10
+        - 20
+        description:
+          - The second number
+        type: float
+        required: True
+      third:
+        description:
+          - The third number
+        type: float
+      fourth:
+        description:
+          - The fourth number
+        type: float
 
 notes:
 
@@ -56,6 +84,11 @@ connection_details:
   type: dict
 sum:
   description: The sum of the numbers
-  returned: always
+  returned: when operands is not provided
   type: int
+sums:
+  description: The sum of each set of numbers in operands, in the same order
+  returned: when operands is provided
+  type: list
+  elements: float
 """
\ No newline at end of file
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Pluggable credential sources
+
+A source resolves the password for a user from a path, eg a file or a
+local vault document.
+
+password = resolve_password(
+    source="file", path="~/.secrets/network", user="brad"
+)
+
+Additional sources can be added with register_credential_source.
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import json
+import os
+
+from ansible.errors import AnsibleError
+
+
+class FileCredentialSource:
+    """The password is the content of a file, shared by every user"""
+
+    def resolve(self, path, user):
+        """Read the password from the file
+
+        :param path: The file containing the password
+        :type path: str
+        :param user: The user the password is for
+        :type user: str
+        :return: The password
+        :rtype: str
+        """
+        try:
+            with open(os.path.expanduser(path)) as fhand:
+                return fhand.read().strip()
+        except (IOError, OSError) as exc:
+            raise AnsibleError(
+                "Unable to read the credential file {path}: {err}".format(
+                    path=path, err=exc
+                )
+            )
+
+
+class VaultCredentialSource:
+    """A local stand-in for a secrets vault
+
+    The path is a json document mapping users to passwords,
+    eg {"brad": "password"}
+    """
+
+    def resolve(self, path, user):
+        """Look up the password for the user
+
+        :param path: The json document of users and passwords
+        :type path: str
+        :param user: The user the password is for
+        :type user: str
+        :return: The password
+        :rtype: str
+        """
+        try:
+            with open(os.path.expanduser(path)) as fhand:
+                secrets = json.load(fhand)
+        except (IOError, OSError, ValueError) as exc:
+            raise AnsibleError(
+                "Unable to read the credential vault {path}: {err}".format(
+                    path=path, err=exc
+                )
+            )
+        try:
+            return secrets[user]
+        except KeyError:
+            raise AnsibleError(
+                "No credential for user '{user}' in {path}".format(
+                    user=user, path=path
+                )
+            )
+
+
+CREDENTIAL_SOURCES = {
+    "file": FileCredentialSource(),
+    "vault": VaultCredentialSource(),
+}
+
+
+def register_credential_source(name, source):
+    """Add or replace a credential source
+
+    :param name: The name used in the credential_source option
+    :type name: str
+    :param source: An object with a resolve(path, user) method
+    :type source: object
+    """
+    CREDENTIAL_SOURCES[name] = source
+
+
+def credential_source(name):
+    """The registered credential source
+
+    :param name: The name of the credential source
+    :type name: str
+    :raises AnsibleError: If no source is registered with the name
+    :return: The credential source
+    :rtype: object
+    """
+    try:
+        return CREDENTIAL_SOURCES[name]
+    except KeyError:
+        raise AnsibleError(
+            "Unknown credential source '{source}', expected one of: {sources}".format(
+                source=name, sources=", ".join(sorted(CREDENTIAL_SOURCES))
+            )
+        )
+
+
+def resolve_password(source, path, user):
+    """Resolve a password from a credential source
+
+    :param source: The name of the credential source
+    :type source: str
+    :param path: The path passed to the source
+    :type path: str
+    :param user: The user the password is for
+    :type user: str
+    :return: The password
+    :rtype: str
+    """
+    resolver = credential_source(source)
+    if not path:
+        raise AnsibleError(
+            "credential_source_path is required for the '{source}' source".format(
+                source=source
+            )
+        )
+    return resolver.resolve(path, user)
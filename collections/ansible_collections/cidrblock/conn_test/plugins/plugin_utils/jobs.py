@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Background jobs for long running calls in the persistent connection
+
+Jobs run on a pool of threads in ansible-connection, so the RPC that
+submits a job returns immediately and the socket is free for other
+requests while it runs.
+
+runner = JobRunner(workers=4)
+job_id = runner.submit(connection.direct_method, kwargs={"org": "ansible"})
+runner.poll(job_id)
+{"job_id": "...", "state": "running", "finished": False, ...}
+runner.result(job_id, timeout=10)
+{"job_id": "...", "state": "finished", "finished": True, "result": [...]}
+
+A finished job is kept until its result is collected, or for the
+retention period, pending counts the jobs not yet collected.
+
+A job submitted with a results_dir is collected as it finishes into a
+file named for the job id, in the format async_status reads, so ansible
+polls it as it would a module run with async:
+
+job_id = runner.submit(
+    connection.direct_method,
+    kwargs={"org": "ansible"},
+    results_dir="/home/brad/.ansible_async",
+    result_key="repos",
+)
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import json
+import os
+import threading
+import time
+import uuid
+
+
+def write_results_file(path, data):
+    """Replace a results file, async_status never reads a partial file
+
+    :param path: The results file
+    :type path: str
+    :param data: The results
+    :type data: dict
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp_path = "{path}.tmp".format(path=path)
+    with open(tmp_path, "w") as fhand:
+        json.dump(data, fhand)
+    os.rename(tmp_path, path)
+
+
+class Job:
+    def __init__(self, job_id, label):
+        """A submitted job, its future is set once submitted
+
+        :param job_id: The id of the job
+        :type job_id: str
+        :param label: A label returned with the status, eg the action's get
+        :type label: str
+        """
+        self.job_id = job_id
+        self.label = label
+        self.future = None
+        self.submitted = time.time()
+        self.started = None
+        self.ended = None
+
+    @property
+    def state(self):
+        """queued, running, finished or failed"""
+        if not self.future.done():
+            return "running" if self.started else "queued"
+        if self.future.cancelled() or self.future.exception() is not None:
+            return "failed"
+        return "finished"
+
+    def status(self):
+        """The status of the job
+
+        :return: The id, label, state and timing of the job
+        :rtype: dict
+        """
+        state = self.state
+        end = self.ended or time.time()
+        return {
+            "job_id": self.job_id,
+            "label": self.label,
+            "state": state,
+            "finished": state in ("finished", "failed"),
+            "submitted": self.submitted,
+            "elapsed": end - self.started if self.started else 0.0,
+        }
+
+
+class JobRunner:
+    def __init__(self, workers=4, retention=3600):
+        """Run calls on a pool of threads
+
+        :param workers: The number of jobs run at the same time
+        :type workers: int
+        :param retention: The seconds a finished job is kept for collection
+        :type retention: int
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="job"
+        )
+        self._retention = retention
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _run(self, job, func, args, kwargs):
+        job.started = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            job.ended = time.time()
+
+    def _prune(self):
+        """Drop finished jobs that were not collected within the retention"""
+        cutoff = time.time() - self._retention
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.ended is not None and job.ended < cutoff:
+                    del self._jobs[job_id]
+
+    def _collect_to_file(self, job_id, results_file, result_key):
+        """Collect a finished job into its results file"""
+        status = self.result(job_id)
+        results = {
+            "ansible_job_id": job_id,
+            "started": 1,
+            "finished": 1,
+            "elapsed": status["elapsed"],
+        }
+        if status["state"] == "failed":
+            results["failed"] = True
+            results["msg"] = status["msg"]
+        else:
+            results[result_key] = status["result"]
+        write_results_file(results_file, results)
+
+    def submit(
+        self,
+        func,
+        args=None,
+        kwargs=None,
+        label=None,
+        results_dir=None,
+        result_key="result",
+    ):
+        """Submit a call as a job
+
+        :param func: The callable
+        :type func: Callable
+        :param args: The positional arguments for the call
+        :type args: list
+        :param kwargs: The keyword arguments for the call
+        :type kwargs: dict
+        :param label: A label returned with the status
+        :type label: str
+        :param results_dir: Collect the job as it finishes into a file
+            in this directory named for the job id, for async_status
+        :type results_dir: str
+        :param result_key: The key of the result in the results file
+        :type result_key: str
+        :return: The job id
+        :rtype: str
+        """
+        self._prune()
+        job = Job(uuid.uuid4().hex, label)
+        results_file = None
+        if results_dir:
+            results_file = os.path.join(results_dir, job.job_id)
+            write_results_file(
+                results_file,
+                {"ansible_job_id": job.job_id, "started": 1, "finished": 0},
+            )
+        # known before it can finish, a job collected to a file is
+        # collected as it finishes
+        with self._lock:
+            self._jobs[job.job_id] = job
+            job.future = self._executor.submit(
+                self._run, job, func, args or [], kwargs or {}
+            )
+        if results_file:
+            job.future.add_done_callback(
+                lambda _future: self._collect_to_file(
+                    job.job_id, results_file, result_key
+                )
+            )
+        return job.job_id
+
+    def _get(self, job_id):
+        """
+        :raises KeyError: If the job is unknown or already collected
+        """
+        with self._lock:
+            try:
+                return self._jobs[job_id]
+            except KeyError:
+                raise KeyError(
+                    "Unknown job '{job_id}', it may have been collected already".format(
+                        job_id=job_id
+                    )
+                )
+
+    def poll(self, job_id):
+        """The status of a job
+
+        :param job_id: The job id
+        :type job_id: str
+        :raises KeyError: If the job is unknown
+        :return: The status
+        :rtype: dict
+        """
+        return self._get(job_id).status()
+
+    def result(self, job_id, timeout=0):
+        """Wait for a job and collect its result
+
+        A finished or failed job is removed once collected
+
+        :param job_id: The job id
+        :type job_id: str
+        :param timeout: The seconds to wait for the job to finish
+        :type timeout: float
+        :raises KeyError: If the job is unknown
+        :return: The status, with the result or the error once finished
+        :rtype: dict
+        """
+        from concurrent.futures import wait
+
+        job = self._get(job_id)
+        if timeout:
+            wait([job.future], timeout=timeout)
+        status = job.status()
+        if not status["finished"]:
+            return status
+        exc = job.future.exception() if not job.future.cancelled() else None
+        if job.future.cancelled():
+            status["msg"] = "Job was cancelled"
+        elif exc is not None:
+            status["msg"] = str(getattr(exc, "message", None) or exc)
+        else:
+            status["result"] = job.future.result()
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        return status
+
+    def pending(self):
+        """The number of jobs not yet collected
+
+        :rtype: int
+        """
+        self._prune()
+        with self._lock:
+            return len(self._jobs)
+
+    def jobs(self):
+        """The status of every job
+
+        :rtype: list
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.status() for job in jobs]
+
+    def shutdown(self):
+        """Cancel queued jobs, running jobs are not waited for"""
+        for job in list(self._jobs.values()):
+            job.future.cancel()
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            self._jobs.clear()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Compile the argspecs of the action plugins before the workers fork
+
+Every worker is forked from the controller and validates its first task
+against a schema nobody has compiled in that process yet, parsing the
+DOCUMENTATION and building the validators again. Run in the controller
+before the workers fork, the action plugins are imported and their
+argspecs compiled into SCHEMA_REGISTRY, which the workers inherit.
+
+timings = warm_action_plugins()
+{"add": 0.0042}
+
+A plugin is warmed when it has a DOCUMENTATION, its ARGSPEC_CONDITIONALS
+are used if it has them. The prefork_warm callback calls this when the
+playbook starts.
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import glob
+import importlib
+import os
+import time
+
+COLLECTION = "cidrblock.conn_test"
+ACTION_PACKAGE = "ansible_collections.cidrblock.conn_test.plugins.action"
+ACTION_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "action"
+)
+
+
+def action_plugins():
+    """The action plugins in the collection
+
+    :return: The plugin names, eg add
+    :rtype: list
+    """
+    return sorted(
+        os.path.basename(path)[:-3]
+        for path in glob.glob(os.path.join(ACTION_PATH, "*.py"))
+        if not os.path.basename(path).startswith("_")
+    )
+
+
+def warm_action_plugins(plugins=None):
+    """Import the action plugins and compile their argspecs
+
+    A plugin that cannot be imported or compiled is left for its
+    workers, which report the error as they would have
+
+    :param plugins: The plugin names, all of them when not given
+    :type plugins: list
+    :return: The seconds taken by each plugin warmed, or the error
+    :rtype: dict
+    """
+    from ansible_collections.cidrblock.conn_test.plugins.module_utils.argspec_schema import (
+        SCHEMA_REGISTRY,
+    )
+    from ansible_collections.cidrblock.conn_test.plugins.module_utils.doc_fragments import (
+        DocFragmentError,
+    )
+
+    timings = {}
+    for plugin in action_plugins() if plugins is None else plugins:
+        started = time.time()
+        try:
+            module = importlib.import_module(
+                "{0}.{1}".format(ACTION_PACKAGE, plugin)
+            )
+            documentation = getattr(module, "DOCUMENTATION", None)
+            if documentation is None:
+                continue
+            SCHEMA_REGISTRY.compile(
+                documentation,
+                schema_format="doc",
+                schema_conditionals=getattr(
+                    module, "ARGSPEC_CONDITIONALS", None
+                ),
+                name="{0}.{1}".format(COLLECTION, plugin),
+            )
+        except (ImportError, DocFragmentError) as exc:
+            timings[plugin] = "{0}: {1}".format(type(exc).__name__, exc)
+            continue
+        timings[plugin] = time.time() - started
+    return timings
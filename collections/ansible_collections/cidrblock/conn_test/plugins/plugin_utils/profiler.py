@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""On-demand profiling for the persistent connection process
+
+The ansible-connection process outlives the worker that started it,
+so it cannot be profiled from the outside. A connection arms an
+RpcProfiler, calls tick() after every RPC it handles and the profiler
+stops itself and writes its output once the RPC count or the duration
+is reached.
+
+profiler = RpcProfiler(kind="cprofile", directory="/tmp/prof", rpc_count=50)
+profiler.start()
+...
+written = profiler.tick()
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import os
+import sys
+import threading
+import time
+
+PROFILER_KINDS = ("cprofile", "sampling")
+
+
+class CProfileCollector:
+    """Deterministic profiling of the calling thread using cProfile
+    The output is written in pstats format
+    """
+
+    extension = "pstats"
+
+    def __init__(self):
+        import cProfile
+
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self, path):
+        """Stop profiling and write the stats
+
+        :param path: The file to write the pstats to
+        :type path: str
+        """
+        self._profile.disable()
+        self._profile.dump_stats(path)
+
+
+class SamplingCollector:
+    """Statistical profiling of the calling thread
+
+    A daemon thread periodically captures the stack of the profiled
+    thread, the output is written as collapsed stacks, one line per
+    unique stack, suitable for flamegraph.pl or speedscope
+    """
+
+    extension = "collapsed"
+
+    def __init__(self, interval=0.005):
+        """
+        :param interval: The seconds between samples
+        :type interval: float
+        """
+        self._interval = interval
+        self._samples = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._thread_id = None
+
+    def _sample(self):
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    "{func} ({file}:{line})".format(
+                        func=code.co_name,
+                        file=os.path.basename(code.co_filename),
+                        line=code.co_firstlineno,
+                    )
+                )
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self._samples[key] = self._samples.get(key, 0) + 1
+
+    def start(self):
+        self._thread_id = threading.current_thread().ident
+        self._thread = threading.Thread(
+            target=self._sample, name="rpc-profiler"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, path):
+        """Stop sampling and write the collapsed stacks
+
+        :param path: The file to write the collapsed stacks to
+        :type path: str
+        """
+        self._stop_event.set()
+        self._thread.join()
+        with open(path, "w") as fhand:
+            for stack, count in sorted(self._samples.items()):
+                fhand.write(
+                    "{stack} {count}\n".format(stack=stack, count=count)
+                )
+
+
+class RpcProfiler:
+    def __init__(
+        self, kind, directory, rpc_count=0, duration=0, interval=0.005
+    ):
+        """Profile a number of RPCs or a period of time
+
+        :param kind: One of PROFILER_KINDS
+        :type kind: str
+        :param directory: The directory the output is written to
+        :type directory: str
+        :param rpc_count: Stop after this many RPCs, 0 for no limit
+        :type rpc_count: int
+        :param duration: Stop after this many seconds, 0 for no limit
+        :type duration: int
+        :param interval: The seconds between samples for the sampling profiler
+        :type interval: float
+
+        note:
+        - the duration is checked as each RPC completes, since the
+          cProfile collector can only be stopped from the profiled thread.
+          A profiler still running when the connection closes is stopped
+          and written then
+        """
+        if kind not in PROFILER_KINDS:
+            raise ValueError(
+                "Unknown profiler '{kind}', expected one of: {kinds}".format(
+                    kind=kind, kinds=", ".join(PROFILER_KINDS)
+                )
+            )
+        self._kind = kind
+        self._directory = os.path.expanduser(directory)
+        self._rpc_count = rpc_count or 0
+        self._duration = duration or 0
+        self._interval = interval
+        self._collector = None
+        self._started = None
+        self._rpcs = 0
+        self.written = None
+
+    @property
+    def active(self):
+        return self._collector is not None
+
+    def status(self):
+        """The current state of the profiler
+
+        :return: A summary of the profiler
+        :rtype: dict
+        """
+        return {
+            "active": self.active,
+            "profiler": self._kind,
+            "rpcs": self._rpcs,
+            "elapsed": time.time() - self._started if self._started else 0,
+            "written": self.written,
+        }
+
+    def start(self):
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+        if self._kind == "cprofile":
+            self._collector = CProfileCollector()
+        else:
+            self._collector = SamplingCollector(interval=self._interval)
+        self._started = time.time()
+        self._collector.start()
+
+    def tick(self):
+        """Count an RPC and stop if a limit was reached
+
+        :return: The path of the output if the profiler stopped
+        :rtype: str or None
+        """
+        if not self.active:
+            return None
+        self._rpcs += 1
+        if self._rpc_count and self._rpcs >= self._rpc_count:
+            return self.stop()
+        if self._duration and time.time() - self._started >= self._duration:
+            return self.stop()
+        return None
+
+    def stop(self):
+        """Stop the profiler and write the output
+
+        :return: The path of the output
+        :rtype: str or None
+        """
+        if not self.active:
+            return None
+        path = os.path.join(
+            self._directory,
+            "ansible-connection-{pid}-{started}.{msec:03d}.{ext}".format(
+                pid=os.getpid(),
+                started=time.strftime(
+                    "%Y%m%dT%H%M%S", time.localtime(self._started)
+                ),
+                msec=int(self._started * 1000) % 1000,
+                ext=self._collector.extension,
+            ),
+        )
+        collector, self._collector = self._collector, None
+        collector.stop(path)
+        self.written = path
+        return path
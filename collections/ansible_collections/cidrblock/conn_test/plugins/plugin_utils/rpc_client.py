@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""A JSON-RPC client for the persistent connection that keeps its socket
+
+ansible's Connection opens a new socket to ansible-connection for every
+RPC. ansible-connection serves any number of requests on an accepted
+socket, so the client here connects once and sends every request of a
+task over the same socket, requests can also be pipelined, written
+together before the responses are read.
+
+client = RpcClient(socket_path)
+try:
+    user = client.indirect_method("get_user")
+    user, repos = client.pipeline(
+        [("indirect_method", ["get_user"], {}), ("direct_method", ["org_repos"], {})]
+    )
+finally:
+    client.close()
+
+ansible-connection handles one socket at a time and does not accept
+another while one is open, the task executor and other workers sharing
+the connection are blocked until the socket is closed, so a client is
+created for a single run of an action and closed before the action
+returns. The persistent process cannot be restarted while the client
+holds its socket, a request that fails is never sent again, it may have
+been run.
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import json
+import os
+import pickle
+import socket
+import struct
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.connection import (
+    Connection,
+    ConnectionError,
+    recv_data,
+    request_builder,
+)
+
+try:
+    from ansible.module_utils.connection import _get_legacy_encoder
+except ImportError:
+    from ansible.module_utils.common.json import AnsibleJSONEncoder
+
+    def _get_legacy_encoder():
+        return AnsibleJSONEncoder
+
+
+# The requests written before their responses are read, the responses of a
+# window are read before the next is written so neither side blocks writing
+PIPELINE_WINDOW = 16
+
+
+def _frame(data):
+    """A request as ansible-connection reads it, the length then the data"""
+    data = to_bytes(data)
+    return struct.pack("!Q", len(data)) + data
+
+
+class RpcClient(Connection):
+    """A Connection that sends every request over one socket"""
+
+    def __init__(self, socket_path):
+        """
+        :param socket_path: The ansible-connection socket
+        :type socket_path: str
+        """
+        super(RpcClient, self).__init__(socket_path)
+        self._sock = None
+
+    def _open(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as exc:
+            sock.close()
+            raise ConnectionError(
+                "Unable to connect to socket {path}: {err}".format(
+                    path=self.socket_path, err=to_text(exc)
+                )
+            )
+        self._sock = sock
+
+    def _write(self, payload):
+        """Write to the open socket, opening it first if needed
+
+        :param payload: The framed requests
+        :type payload: bytes
+        """
+        if self._sock is None:
+            self._open()
+        try:
+            self._sock.sendall(payload)
+        except OSError as exc:
+            self.close()
+            raise ConnectionError(
+                "Unable to write to socket {path}: {err}".format(
+                    path=self.socket_path, err=to_text(exc)
+                )
+            )
+
+    def _read(self):
+        err = "the connection was closed"
+        try:
+            response = recv_data(self._sock)
+        except OSError as exc:
+            response = None
+            err = to_text(exc)
+        if response is None:
+            self.close()
+            raise ConnectionError(
+                "Unable to read the response from socket {path}: {err}".format(
+                    path=self.socket_path, err=err
+                )
+            )
+        return to_text(response, errors="surrogate_or_strict")
+
+    def send(self, data):
+        """Send a request and read its response, used by the Connection
+        for every RPC
+
+        :param data: The json request
+        :type data: str
+        :return: The json response
+        :rtype: str
+        """
+        self._write(_frame(data))
+        return self._read()
+
+    def _decode(self, request, out):
+        """The result of a pipelined request, as the Connection would
+        return it
+        """
+        try:
+            response = json.loads(out)
+        except ValueError:
+            raise ConnectionError(
+                "Unable to decode JSON from response to {0}. Received '{1}'.".format(
+                    request["method"], out
+                )
+            )
+        if response.get("id") != request["id"]:
+            raise ConnectionError("invalid json-rpc id received")
+        if "error" in response:
+            err = response["error"]
+            raise ConnectionError(
+                to_text(
+                    err.get("data") or err["message"],
+                    errors="surrogate_then_replace",
+                ),
+                code=err["code"],
+            )
+        if "result_type" in response:
+            return pickle.loads(
+                to_bytes(response["result"], errors="surrogateescape")
+            )
+        return response["result"]
+
+    def pipeline(self, calls):
+        """Run several RPCs, writing the requests of a window together
+        before reading their responses
+
+        :param calls: The method, args and kwargs of each RPC
+        :type calls: list
+        :raises ConnectionError: For the first RPC that failed, the
+            responses of the window are read before it is raised
+        :return: The result of each RPC, in order
+        :rtype: list
+        """
+        if not os.path.exists(self.socket_path):
+            raise ConnectionError(
+                "socket path {0} does not exist or cannot be found".format(
+                    self.socket_path
+                )
+            )
+        encoder = _get_legacy_encoder()
+        results = []
+        for start in range(0, len(calls), PIPELINE_WINDOW):
+            requests = []
+            for method, args, kwargs in calls[start : start + PIPELINE_WINDOW]:
+                requests.append(request_builder(method, *args, **kwargs))
+            try:
+                payload = b"".join(
+                    _frame(json.dumps(req, cls=encoder, vault_to_text=True))
+                    for req in requests
+                )
+            except TypeError as exc:
+                raise ConnectionError(
+                    "Failed to encode some variables as JSON for communication "
+                    "with the persistent connection helper: {0}".format(
+                        to_text(exc)
+                    )
+                )
+            self._write(payload)
+            error = None
+            for request in requests:
+                out = self._read()
+                try:
+                    results.append(self._decode(request, out))
+                except ConnectionError as exc:
+                    error = error or exc
+            if error is not None:
+                raise error
+        return results
+
+    def close(self):
+        """Close the socket, the next RPC opens a new one"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
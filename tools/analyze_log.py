@@ -0,0 +1,662 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Per task and per RPC timing breakdown of an ansible log
+
+Reads a log written with ansible's log_path, eg log.txt, where each entry
+starts with "<timestamp> p=<pid> u=<user> n=<name> |", or with the level
+"n=<name> <level>|" from ansible 2.19, and reports:
+
+- the duration of each task, with the slowest tasks
+- the latency of each JSON-RPC handled by the persistent connection process
+- the latency of the connection methods logged with "(<process>:<pid>) Called: <name>"
+  eg _connect, set_options and update_play_context
+- the time workers spend starting or attaching to the persistent connection
+- redundant RPCs, those repeated with identical params on the same connection
+  process, and RPCs that returned an error
+- the lifetime of each persistent connection process, with --timeline each
+  process is printed as it shuts down, with its RPC count and time
+
+The log is streamed, memory use depends on the number of distinct task names,
+methods and in-flight requests, not on the size of the log.
+
+python tools/analyze_log.py log.txt
+python tools/analyze_log.py --timeline --slow-task 0.5 log.txt
+zcat ansible.log.gz | python tools/analyze_log.py --json -
+
+note:
+- the "Called:" entries are logged as a method is entered, a method's latency
+  is measured until the next "Called:" entry or the RPC response in the same
+  process, whichever comes first
+- percentiles come from log scale buckets and are accurate to about 12%
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import re
+import sys
+import time
+
+RECORD_RE = re.compile(
+    r"^(?P<ts>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(?P<msec>\d{3})"
+    r" p=(?P<pid>\d+) u=\S+ n=\S+(?: [A-Z]+)? ?\| ?(?P<msg>.*)$"
+)
+TASK_RE = re.compile(r"^TASK \[(?P<task>.*)\] \**\s*$")
+PLAY_RE = re.compile(r"^PLAY (\[.*\]|RECAP) \**\s*$")
+TASK_RESULT_RE = re.compile(
+    r"^(?P<status>ok|changed|fatal|failed|skipping|unreachable): \["
+)
+RPC_REQUEST_RE = re.compile(
+    r'^jsonrpc request: b\'\{"jsonrpc": "2\.0", "method": "(?P<method>[^"]+)",'
+    r' "id": "(?P<id>[^"]+)"'
+)
+RPC_RESPONSE_RE = re.compile(
+    r'^jsonrpc response: \{"jsonrpc": "2\.0", "id": "(?P<id>[^"]+)"'
+)
+CALLED_RE = re.compile(
+    r"^\((?P<command>.*):(?P<pid>\d+)\) Called: (?P<func>\w+)", re.DOTALL
+)
+START_CONNECTION = "attempting to start connection"
+STARTED_CONNECTION = "local domain socket path is"
+SHUTDOWN = "shutdown complete"
+# The persistent connection process, ansible-connection or the script it was
+# replaced with, as PERSISTENT_PROCESS_NAMES in the github connection plugin
+PERSISTENT_PROCESS_NAMES = (
+    "ansible-connection",
+    "ansible_connection_cli_stub.py",
+)
+
+# Continuation lines, eg tracebacks, are only kept up to this length
+MAX_RECORD_LENGTH = 4096
+
+
+class Histogram:
+    """Latency distribution in fixed log scale buckets"""
+
+    BUCKETS_PER_DECADE = 20
+    FLOOR = 1e-6
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._buckets = {}
+
+    def add(self, value):
+        """Add a value in seconds
+
+        :param value: The value to add
+        :type value: float
+        """
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        bucket = int(
+            math.floor(
+                math.log10(max(value, self.FLOOR) / self.FLOOR)
+                * self.BUCKETS_PER_DECADE
+            )
+        )
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def percentile(self, pct):
+        """The approximate value at a percentile
+
+        :param pct: The percentile, 0-100
+        :type pct: float
+        :return: The upper bound of the bucket holding the percentile
+        :rtype: float
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * pct / 100.0)))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                upper = self.FLOOR * 10 ** (
+                    (bucket + 1) / float(self.BUCKETS_PER_DECADE)
+                )
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """A summary of the distribution
+
+        :return: count, total, min, mean, p50, p90, p99 and max
+        :rtype: dict
+        """
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Task:
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start
+        self.results = {}
+        self.rpcs = 0
+        self.rpc_time = 0.0
+
+    def summary(self, end):
+        return {
+            "name": self.name,
+            "start": time.strftime(
+                "%Y-%m-%d %H:%M:%S", time.localtime(self.start)
+            ),
+            "duration": end - self.start,
+            "results": self.results,
+            "rpcs": self.rpcs,
+            "rpc_time": self.rpc_time,
+        }
+
+
+class ConnectionProcess:
+    def __init__(self, pid, start):
+        self.pid = pid
+        self.playbook = None
+        self.start = start
+        self.last = start
+        self.rpcs = 0
+        self.rpc_time = 0.0
+        self.errors = 0
+
+    def summary(self):
+        return {
+            "pid": self.pid,
+            "playbook": self.playbook,
+            "start": time.strftime(
+                "%Y-%m-%d %H:%M:%S", time.localtime(self.start)
+            ),
+            "duration": self.last - self.start,
+            "rpcs": self.rpcs,
+            "rpc_time": self.rpc_time,
+            "errors": self.errors,
+        }
+
+
+def connection_args(command):
+    """The arguments of a persistent connection process
+
+    :param command: The command line of the process
+    :type command: str
+    :return: The arguments after the process name, None for other processes
+    :rtype: list
+    """
+    for name in PERSISTENT_PROCESS_NAMES:
+        if name in command:
+            return command.split(name, 1)[1].split()
+    return None
+
+
+class LogAnalyzer:
+    def __init__(
+        self, slow_task=1.0, top=10, timeline=None, connection_timeline=None
+    ):
+        """Accumulate timings from the records of an ansible log
+
+        :param slow_task: Tasks taking longer than this many seconds are slow
+        :type slow_task: float
+        :param top: The number of slowest tasks to report
+        :type top: int
+        :param timeline: Called with the summary of each task as it completes
+        :type timeline: Callable
+        :param connection_timeline: Called with the summary of each persistent
+            connection process as it shuts down
+        :type connection_timeline: Callable
+        """
+        self._slow_task = slow_task
+        self._top = top
+        self._timeline = timeline
+        self._connection_timeline = connection_timeline
+        self._ts_cache = (None, None)
+        self.tasks = {}
+        self.rpcs = {}
+        self.calls = {}
+        self.start_connection = Histogram()
+        self.connection_lifetime = Histogram()
+        self.slowest = []
+        self.slow_tasks = 0
+        self.redundant = {}
+        self.errors = {}
+        self.records = 0
+        # state, keyed by pid
+        self._current_task = {}
+        self._last_playbook = None
+        self._process_playbook = {}
+        self._pending_rpcs = {}
+        self._open_call = {}
+        self._last_params = {}
+        self._starting = {}
+        self._connections = {}
+
+    def timestamp(self, ts, msec):
+        """Convert the log timestamp to an epoch, caching per second"""
+        if self._ts_cache[0] != ts:
+            self._ts_cache = (
+                ts,
+                time.mktime(time.strptime(ts, "%Y-%m-%d %H:%M:%S")),
+            )
+        return self._ts_cache[1] + int(msec) / 1000.0
+
+    def _task_for(self, pid):
+        playbook = self._process_playbook.get(pid, self._last_playbook)
+        return self._current_task.get(playbook)
+
+    def _end_task(self, playbook, now):
+        task = self._current_task.pop(playbook, None)
+        if task is None:
+            return
+        summary = task.summary(now)
+        self.tasks.setdefault(task.name, Histogram()).add(summary["duration"])
+        if summary["duration"] >= self._slow_task:
+            self.slow_tasks += 1
+            entry = (summary["duration"], self.records, summary)
+            if len(self.slowest) < self._top:
+                heapq.heappush(self.slowest, entry)
+            elif self._top:
+                heapq.heappushpop(self.slowest, entry)
+        if self._timeline:
+            self._timeline(summary)
+
+    def _connection(self, pid, now):
+        process = self._connections.get(pid)
+        if process is None:
+            process = self._connections[pid] = ConnectionProcess(pid, now)
+        return process
+
+    def _end_connection(self, pid):
+        process = self._connections.pop(pid, None)
+        if process is None:
+            return
+        summary = process.summary()
+        self.connection_lifetime.add(summary["duration"])
+        if self._connection_timeline:
+            self._connection_timeline(summary)
+
+    def _close_call(self, pid, now):
+        call = self._open_call.pop(pid, None)
+        if call is not None:
+            self.calls.setdefault(call[0], Histogram()).add(now - call[1])
+
+    def feed(self, pid, now, msg):
+        """Process a single, complete log record
+
+        :param pid: The process id from the record
+        :type pid: str
+        :param now: The epoch timestamp of the record
+        :type now: float
+        :param msg: The record's message, including continuation lines
+        :type msg: str
+        """
+        self.records += 1
+        process = self._connections.get(pid)
+        if process is not None:
+            process.last = now
+        # messages relayed from the persistent connection to a worker
+        # are prefixed with the host, they were counted at the source
+        if msg.startswith("<"):
+            if START_CONNECTION in msg:
+                self._starting[pid] = now
+            elif STARTED_CONNECTION in msg and pid in self._starting:
+                self.start_connection.add(now - self._starting.pop(pid))
+            return
+
+        match = TASK_RE.match(msg)
+        if match:
+            self._end_task(pid, now)
+            self._current_task[pid] = Task(match.group("task"), now)
+            self._last_playbook = pid
+            return
+        if PLAY_RE.match(msg):
+            self._end_task(pid, now)
+            return
+
+        match = RPC_REQUEST_RE.match(msg)
+        if match:
+            method = match.group("method")
+            self._connection(pid, now)
+            self._pending_rpcs[(pid, match.group("id"))] = (method, now)
+            digest = hashlib.sha1(
+                msg[match.end() :].encode("utf-8", "replace")
+            ).hexdigest()
+            if self._last_params.get((pid, method)) == digest:
+                self.redundant[method] = self.redundant.get(method, 0) + 1
+            self._last_params[(pid, method)] = digest
+            return
+
+        match = RPC_RESPONSE_RE.match(msg)
+        if match:
+            pending = self._pending_rpcs.pop((pid, match.group("id")), None)
+            self._close_call(pid, now)
+            if pending is None:
+                return
+            method, started = pending
+            self.rpcs.setdefault(method, Histogram()).add(now - started)
+            process = self._connection(pid, now)
+            process.rpcs += 1
+            process.rpc_time += now - started
+            if '"error":' in msg[match.end() :]:
+                self.errors[method] = self.errors.get(method, 0) + 1
+                process.errors += 1
+            task = self._task_for(pid)
+            if task is not None:
+                task.rpcs += 1
+                task.rpc_time += now - started
+            return
+
+        match = CALLED_RE.match(msg)
+        if match:
+            self._close_call(pid, now)
+            args = connection_args(match.group("command"))
+            kind = "worker" if args is None else "connection"
+            name = "{func} ({kind})".format(
+                func=match.group("func"), kind=kind
+            )
+            self._open_call[pid] = (name, now)
+            if args is not None:
+                # ansible-connection [-v...] <playbook pid> <task uuid>
+                playbook = next((arg for arg in args if arg.isdigit()), None)
+                process = self._connection(pid, now)
+                if playbook is not None:
+                    self._process_playbook[pid] = playbook
+                    process.playbook = playbook
+            return
+
+        result = TASK_RESULT_RE.match(msg)
+        if result:
+            task = self._current_task.get(pid)
+            if task is not None:
+                status = result.group("status")
+                task.results[status] = task.results.get(status, 0) + 1
+            return
+
+        if msg.startswith(SHUTDOWN):
+            self._close_call(pid, now)
+            self._end_connection(pid)
+            self._process_playbook.pop(pid, None)
+            for key in [k for k in self._last_params if k[0] == pid]:
+                del self._last_params[key]
+
+    def finish(self, now):
+        """End any task or connection process still running at the end of
+        the log
+        """
+        for playbook in list(self._current_task):
+            self._end_task(playbook, now)
+        for pid in list(self._connections):
+            self._end_connection(pid)
+
+    def report(self):
+        """The complete report
+
+        :return: The task, RPC, call and connection process distributions,
+            slow tasks and redundant or failed RPCs
+        :rtype: dict
+        """
+        return {
+            "records": self.records,
+            "tasks": dict(
+                (name, hist.summary()) for name, hist in self.tasks.items()
+            ),
+            "slow_tasks": {
+                "threshold": self._slow_task,
+                "count": self.slow_tasks,
+                "slowest": [
+                    entry[2]
+                    for entry in sorted(
+                        self.slowest, key=lambda e: e[0], reverse=True
+                    )
+                ],
+            },
+            "rpcs": dict(
+                (name, hist.summary()) for name, hist in self.rpcs.items()
+            ),
+            "calls": dict(
+                (name, hist.summary()) for name, hist in self.calls.items()
+            ),
+            "start_connection": self.start_connection.summary(),
+            "connection_lifetime": self.connection_lifetime.summary(),
+            "redundant_rpcs": self.redundant,
+            "rpc_errors": self.errors,
+        }
+
+
+def read_records(fhand):
+    """Yield the records of the log, joining continuation lines
+
+    :param fhand: The open log
+    :type fhand: file
+    :return: pid, timestamp, msec and message for each record
+    :rtype: generator
+    """
+    current = None
+    for line in fhand:
+        line = line.rstrip("\n")
+        match = RECORD_RE.match(line)
+        if match:
+            if current is not None:
+                yield current
+            current = [
+                match.group("pid"),
+                match.group("ts"),
+                match.group("msec"),
+                match.group("msg"),
+            ]
+        elif current is not None and len(current[3]) < MAX_RECORD_LENGTH:
+            current[3] = current[3] + "\n" + line
+    if current is not None:
+        yield current
+
+
+def analyze(fhand, analyzer):
+    """Feed every record of the log to the analyzer
+
+    :param fhand: The open log
+    :type fhand: file
+    :param analyzer: The analyzer
+    :type analyzer: LogAnalyzer
+    """
+    now = None
+    for pid, ts, msec, msg in read_records(fhand):
+        now = analyzer.timestamp(ts, msec)
+        analyzer.feed(pid, now, msg)
+    if now is not None:
+        analyzer.finish(now)
+
+
+def _ms(value):
+    return "-" if value is None else "{:.1f}".format(value * 1000)
+
+
+def _table(title, summaries):
+    lines = [
+        "",
+        title,
+        "{:<40} {:>7} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "name", "count", "total ms", "min", "p50", "p90", "p99", "max"
+        ),
+    ]
+    for name, summary in sorted(
+        summaries.items(), key=lambda i: i[1]["total"], reverse=True
+    ):
+        lines.append(
+            "{:<40} {:>7} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+                name[:40],
+                summary["count"],
+                _ms(summary["total"]),
+                _ms(summary["min"]),
+                _ms(summary["p50"]),
+                _ms(summary["p90"]),
+                _ms(summary["p99"]),
+                _ms(summary["max"]),
+            )
+        )
+    return lines
+
+
+def format_report(report):
+    """Format the report as text
+
+    :param report: The report from LogAnalyzer.report
+    :type report: dict
+    :return: The report
+    :rtype: str
+    """
+    lines = ["{records} log records".format(records=report["records"])]
+    lines.extend(_table("Tasks", report["tasks"]))
+    lines.extend(_table("RPCs (ansible-connection)", report["rpcs"]))
+    lines.extend(_table("Connection methods", report["calls"]))
+    if report["start_connection"]["count"]:
+        lines.extend(
+            _table(
+                "Worker connection start",
+                {"start_connection": report["start_connection"]},
+            )
+        )
+    if report["connection_lifetime"]["count"]:
+        lines.extend(
+            _table(
+                "Connection processes",
+                {"lifetime": report["connection_lifetime"]},
+            )
+        )
+    slow = report["slow_tasks"]
+    lines.extend(
+        [
+            "",
+            "{count} tasks took {threshold}s or longer, slowest:".format(
+                **slow
+            ),
+        ]
+    )
+    for task in slow["slowest"]:
+        lines.append(
+            "  {start} {duration:>9}ms rpcs={rpcs:<4} {name}".format(
+                start=task["start"],
+                duration=_ms(task["duration"]),
+                rpcs=task["rpcs"],
+                name=task["name"],
+            )
+        )
+    if report["redundant_rpcs"]:
+        lines.extend(["", "Redundant RPCs (identical params, same process):"])
+        for method, count in sorted(report["redundant_rpcs"].items()):
+            lines.append("  {method}: {count}".format(method=method, count=count))
+    if report["rpc_errors"]:
+        lines.extend(["", "RPC errors:"])
+        for method, count in sorted(report["rpc_errors"].items()):
+            lines.append("  {method}: {count}".format(method=method, count=count))
+    return "\n".join(lines)
+
+
+def _open(path):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", errors="replace")
+    return open(path, errors="replace")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Per task and per RPC timing breakdown of an ansible log"
+    )
+    parser.add_argument("log", help="the log file, .gz or - for stdin")
+    parser.add_argument(
+        "--slow-task",
+        type=float,
+        default=1.0,
+        help="tasks taking this many seconds or longer are slow (default: 1.0)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="the number of slowest tasks to report (default: 10)",
+    )
+    parser.add_argument(
+        "--timeline",
+        action="store_true",
+        help="print each task as it completes and each connection process"
+        " as it shuts down",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="write the report as json"
+    )
+    args = parser.parse_args(argv)
+
+    def timeline(summary):
+        if args.json:
+            print(json.dumps({"task": summary}))
+        else:
+            print(
+                "{start} {duration:>9}ms rpcs={rpcs:<4} {results} {name}".format(
+                    start=summary["start"],
+                    duration=_ms(summary["duration"]),
+                    rpcs=summary["rpcs"],
+                    results=",".join(
+                        "{k}={v}".format(k=k, v=v)
+                        for k, v in sorted(summary["results"].items())
+                    )
+                    or "-",
+                    name=summary["name"],
+                )
+            )
+
+    def connection_timeline(summary):
+        if args.json:
+            print(json.dumps({"connection": summary}))
+        else:
+            print(
+                "{start} {duration:>9}ms rpcs={rpcs:<4} rpc_time={rpc_time}ms"
+                " errors={errors} connection p={pid} playbook={playbook}".format(
+                    start=summary["start"],
+                    duration=_ms(summary["duration"]),
+                    rpcs=summary["rpcs"],
+                    rpc_time=_ms(summary["rpc_time"]),
+                    errors=summary["errors"],
+                    pid=summary["pid"],
+                    playbook=summary["playbook"] or "-",
+                )
+            )
+
+    analyzer = LogAnalyzer(
+        slow_task=args.slow_task,
+        top=args.top,
+        timeline=timeline if args.timeline else None,
+        connection_timeline=connection_timeline if args.timeline else None,
+    )
+    fhand = _open(args.log)
+    try:
+        analyze(fhand, analyzer)
+    finally:
+        if fhand is not sys.stdin:
+            fhand.close()
+    if args.json:
+        print(json.dumps(analyzer.report(), indent=2))
+    else:
+        print(format_report(analyzer.report()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""The add action's bulk operands compared with one validation per item,
+the work a loop over the task repeats for every item
+"""
+from __future__ import absolute_import, division, print_function
+
+from harness import benchmark
+
+from ansible_collections.cidrblock.conn_test.plugins.action.add import (
+    ARGSPEC_CONDITIONALS,
+    OPERANDS,
+    sum_operands,
+)
+from ansible_collections.cidrblock.conn_test.plugins.module_utils.argspec_validate import (
+    AnsibleArgSpecValidator,
+)
+from ansible_collections.cidrblock.conn_test.plugins.modules.add import (
+    DOCUMENTATION,
+)
+
+SIZES = [10, 100, 1000]
+
+
+def _operands(size):
+    return [
+        {"first": idx, "second": 10, "third": 1, "fourth": 2}
+        for idx in range(size)
+    ]
+
+
+def _validate(data):
+    valid, errors, params = AnsibleArgSpecValidator(
+        data=data,
+        schema=DOCUMENTATION,
+        schema_format="doc",
+        schema_conditionals=ARGSPEC_CONDITIONALS,
+        name="cidrblock.conn_test.add",
+    ).validate()
+    if not valid:
+        raise RuntimeError(errors)
+    return params
+
+
+@benchmark("add/bulk/{size}", size=SIZES)
+def bench_add_bulk(size):
+    operands = _operands(size)
+
+    def run():
+        params = _validate({"operands": [dict(op) for op in operands]})
+        return sum_operands(params["operands"])
+
+    return run
+
+
+@benchmark("add/loop/{size}", size=SIZES)
+def bench_add_loop(size):
+    operands = _operands(size)
+
+    def run():
+        sums = []
+        for operand in operands:
+            params = _validate(dict(operand))
+            sums.append(
+                sum(params[key] for key in OPERANDS if params[key] is not None)
+            )
+        return sums
+
+    return run
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Log analysis throughput
+
+A log in the ansible 2.19 format, with the level after the logger name and
+the persistent connection started as ansible_connection_cli_stub.py, is
+analyzed after checking its tasks, RPCs and connection process are found
+"""
+from __future__ import absolute_import, division, print_function
+
+import io
+import os
+import sys
+
+from harness import benchmark
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from analyze_log import LogAnalyzer, analyze  # noqa: E402
+
+STUB = (
+    "(/usr/bin/python3.11 /usr/lib/python3.11/site-packages/ansible/cli/scripts/"
+    "ansible_connection_cli_stub.py -vvvv 15515 02fc0000-0001-b16d-4215-000000000005"
+)
+WORKER = "(/usr/bin/python3.11 /usr/bin/ansible-playbook -vvvv -i inventory.yaml play.yaml"
+LOGGER = "ansible_collections.cidrblock.conn_test.plugins.connection.github"
+
+LOG_2_19 = """\
+2026-10-19 17:10:12,115 p=15515 u=root n=ansible INFO| PLAYBOOK: play.yaml ****************
+2026-10-19 17:10:12,116 p=15515 u=root n=ansible INFO| PLAY [all] ************************
+2026-10-19 17:10:12,122 p=15515 u=root n=ansible INFO| TASK [cidrblock.conn_test.github] *****
+2026-10-19 17:10:12,196 p=15518 u=root n={logger} DEBUG| {worker}
+:15518) Called: set_options
+2026-10-19 17:10:12,213 p=15515 u=root n=ansible INFO| <github-657cfebedcf16071> attempting to start connection
+2026-10-19 17:10:13,618 p=15538 u=root n={logger} DEBUG| {stub}
+:15538) Called: set_options
+2026-10-19 17:10:13,627 p=15538 u=root n=ansible INFO| jsonrpc request: b'{{"jsonrpc": "2.0", "method": "set_options", "id": "56c1070c", "params": [[], {{}}]}}'
+2026-10-19 17:10:13,646 p=15538 u=root n=ansible INFO| jsonrpc response: {{"jsonrpc": "2.0", "id": "56c1070c", "result": null}}
+2026-10-19 17:10:13,680 p=15538 u=root n=ansible INFO| jsonrpc request: b'{{"jsonrpc": "2.0", "method": "get_capabilities", "id": "6fc1a246", "params": [[], {{}}]}}'
+2026-10-19 17:10:13,685 p=15538 u=root n=ansible INFO| jsonrpc response: {{"jsonrpc": "2.0", "id": "6fc1a246", "error": {{"code": -32601, "message": "Method not found"}}}}
+2026-10-19 17:10:13,819 p=15515 u=root n=ansible INFO| <github-657cfebedcf16071> local domain socket path is /tmp/pc/03e17bb584
+2026-10-19 17:10:13,998 p=15538 u=root n=ansible INFO| jsonrpc request: b'{{"jsonrpc": "2.0", "method": "indirect_method", "id": "a1b2c3d4", "params": [["get_user"], {{}}]}}'
+2026-10-19 17:10:14,004 p=15538 u=root n={logger} DEBUG| {stub}
+:15538) Called: indirect_method
+2026-10-19 17:10:14,011 p=15538 u=root n=urllib3.connectionpool DEBUG| Starting new HTTP connection (1): 127.0.0.1:32859
+2026-10-19 17:10:17,013 p=15538 u=root n=urllib3.connectionpool DEBUG| http://127.0.0.1:32859 "GET /user HTTP/1.1" 200 81
+2026-10-19 17:10:17,020 p=15538 u=root n=ansible INFO| jsonrpc response: {{"jsonrpc": "2.0", "id": "a1b2c3d4", "result": "{{}}"}}
+2026-10-19 17:10:17,026 p=15515 u=root n=ansible WARNING| [WARNING]: Persistent connection logging is enabled for github-657cfebedcf16071.
+
+2026-10-19 17:10:17,027 p=15515 u=root n=ansible INFO| ok: [gh0] => {{
+    "changed": false
+}}
+2026-10-19 17:10:21,230 p=15515 u=root n=ansible INFO| PLAY RECAP ************************
+2026-10-19 17:10:28,377 p=15538 u=root n=ansible INFO| shutdown complete
+""".format(logger=LOGGER, stub=STUB, worker=WORKER)
+
+SIZES = [1, 100]
+
+
+def _analyze(log, connections=None):
+    analyzer = LogAnalyzer(
+        connection_timeline=None if connections is None else connections.append
+    )
+    analyze(io.StringIO(log), analyzer)
+    return analyzer.report()
+
+
+@benchmark("analyze_log/2.19/{size}", size=SIZES)
+def bench_analyze_log(size):
+    """Analyze size copies of an ansible 2.19 log"""
+    connections = []
+    report = _analyze(LOG_2_19, connections)
+    if report["records"] != 20 or list(report["tasks"]) != [
+        "cidrblock.conn_test.github"
+    ]:
+        raise RuntimeError(
+            "2.19 records not parsed: {0} {1}".format(
+                report["records"], list(report["tasks"])
+            )
+        )
+    if "set_options (connection)" not in report["calls"]:
+        raise RuntimeError(
+            "the connection process was not found: {0}".format(
+                list(report["calls"])
+            )
+        )
+    expected = {
+        "pid": "15538",
+        "playbook": "15515",
+        "rpcs": 3,
+        "errors": 1,
+    }
+    found = [
+        dict((key, summary[key]) for key in expected) for summary in connections
+    ]
+    if found != [expected]:
+        raise RuntimeError("connection timeline: {0}".format(connections))
+
+    log = LOG_2_19 * size
+
+    def run():
+        _analyze(log)
+
+    return run
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Logging in the github connection and the demo connection shim
+
+The connections are instantiated as ansible would, with the play context
+verbosity selecting the log level. The log record factory installed by the
+github connection is restored after each benchmark. The demo connection
+details are timed cached, and resolved again after the options change.
+Releasing a host from a shared github connection is timed after checking
+that a host resetting twice does not release the others.
+"""
+from __future__ import absolute_import, division, print_function
+
+import logging
+
+from harness import benchmark
+
+from ansible.playbook.play_context import PlayContext
+from ansible.plugins.loader import connection_loader
+
+VERBOSITIES = [0, 1, 2, 3, 4]
+
+
+def _github(verbosity):
+    play_context = PlayContext()
+    play_context.verbosity = verbosity
+    factory = logging.getLogRecordFactory()
+    connection = connection_loader.get(
+        "cidrblock.conn_test.github", play_context, "/dev/null"
+    )
+    connection.set_options(var_options={"ansible_gh_access_token": "token"})
+    return connection, factory
+
+
+@benchmark("log_with_pid/verbosity_{verbosity}", verbosity=VERBOSITIES)
+def bench_log_with_pid(verbosity):
+    connection, factory = _github(verbosity)
+
+    def run():
+        connection._log_with_pid(msg="Called: benchmark")()
+        del connection._messages[:]
+
+    def cleanup():
+        logging.setLogRecordFactory(factory)
+
+    run.cleanup = cleanup
+    return run
+
+
+@benchmark("log_bridge/verbosity_{verbosity}", verbosity=VERBOSITIES)
+def bench_log_bridge(verbosity):
+    connection, factory = _github(verbosity)
+    logger = logging.getLogger("github")
+    handler = logging.NullHandler()
+    logger.addHandler(handler)
+
+    def run():
+        logger.warning("benchmark")
+        del connection._messages[:]
+
+    def cleanup():
+        logger.removeHandler(handler)
+        logging.setLogRecordFactory(factory)
+
+    run.cleanup = cleanup
+    return run
+
+
+def _shared(host, socket_path):
+    """The github connection of a host, sharing the persistent
+    connection process at socket_path
+    """
+    connection, _factory = _github(0)
+    connection._socket_path = socket_path
+    connection.set_options(
+        var_options={
+            "ansible_gh_access_token": "token",
+            "ansible_gh_share_connection": True,
+            "inventory_hostname": host,
+        }
+    )
+    return connection
+
+
+@benchmark("shared_connection/release")
+def bench_shared_release():
+    """A host registering with and releasing a shared connection
+    while another host is still using it
+    """
+    factory = logging.getLogRecordFactory()
+    connection = _shared("gh0", "/dev/null")
+    connection.set_options(
+        var_options={
+            "ansible_gh_access_token": "token",
+            "ansible_gh_share_connection": True,
+            "inventory_hostname": "gh1",
+        }
+    )
+    # gh0 resets twice, gh1 keeps the connection open
+    connection.reset(host="gh0")
+    connection.reset(host="gh0")
+    if connection._shared_hosts != {"gh1"} or connection._conn_closed:
+        raise RuntimeError(
+            "gh1 was released by gh0: {0}".format(connection._shared_hosts)
+        )
+    connection.reset(host="gh1")
+    if not connection._conn_closed:
+        raise RuntimeError("the connection was not closed by the last host")
+
+    connection = _shared("gh1", "/dev/null")
+    var_options = {
+        "ansible_gh_access_token": "token",
+        "ansible_gh_share_connection": True,
+        "inventory_hostname": "gh0",
+    }
+
+    def run():
+        connection.set_options(var_options=var_options)
+        connection.reset(host="gh0")
+        del connection._messages[:]
+
+    def cleanup():
+        logging.setLogRecordFactory(factory)
+
+    run.cleanup = cleanup
+    return run
+
+
+@benchmark("connection_details/demo/{state}", state=["cached", "cold"])
+def bench_connection_details(state):
+    connection = connection_loader.get(
+        "cidrblock.conn_test.demo", PlayContext(), "/dev/null"
+    )
+    var_options = [
+        {
+            "inventory_hostname": "mock_host1",
+            "ansible_user": "brad",
+            "ansible_password": password,
+        }
+        for password in ("password", "changed")
+    ]
+    connection.set_options(var_options=var_options[0])
+    if state == "cached":
+        return lambda: connection.connection_details
+
+    calls = [0]
+
+    def run():
+        calls[0] += 1
+        connection.set_options(var_options=var_options[calls[0] % 2])
+        return connection.connection_details
+
+    return run
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Validation of large lists of dicts with suboptions
+
+A config style list is validated whole by the ArgumentSpecValidator and
+in chunks, across payload sizes, the peak memory of a call is recorded
+"""
+from __future__ import absolute_import, division, print_function
+
+from harness import benchmark
+
+from ansible_collections.cidrblock.conn_test.plugins.module_utils import (
+    argspec_validate,
+)
+
+DOCUMENTATION = """
+options:
+  config:
+    type: list
+    elements: dict
+    required_together:
+    - [vlan, state]
+    suboptions:
+      name:
+        type: str
+        required: true
+      vlan:
+        type: int
+      state:
+        type: str
+        choices: [up, down]
+      mtu:
+        type: int
+        default: 1500
+      tags:
+        type: list
+        elements: str
+      address:
+        type: dict
+        suboptions:
+          ip:
+            type: str
+            required: true
+          prefix:
+            type: int
+            default: 24
+"""
+# the whole list validation is too slow to time above this size
+WHOLE_SIZES = [100, 1000, 10000]
+CHUNKED_SIZES = [100, 1000, 10000, 100000]
+
+
+def _config(size):
+    return [
+        {
+            "name": "eth{idx}".format(idx=idx),
+            "vlan": idx % 4094 + 1,
+            "state": ("up", "down")[idx % 2],
+            "tags": ["access", "floor{0}".format(idx % 8)],
+            "address": {"ip": "10.0.{0}.{1}".format(idx // 256 % 256, idx % 256)},
+        }
+        for idx in range(size)
+    ]
+
+
+def _validator(size, chunk_size):
+    config = _config(size)
+
+    def run():
+        valid, errors, params = argspec_validate.AnsibleArgSpecValidator(
+            data={"config": config},
+            schema=DOCUMENTATION,
+            schema_format="doc",
+            name="bench",
+            chunk_size=chunk_size,
+        ).validate()
+        if not valid:
+            raise RuntimeError(errors[:3])
+        return params
+
+    run()
+    run.measure_memory = True
+    return run
+
+
+@benchmark("validate/large/whole/{size}", size=WHOLE_SIZES)
+def bench_large_whole(size):
+    return _validator(size, None)
+
+
+@benchmark("validate/large/chunked/{size}", size=CHUNKED_SIZES)
+def bench_large_chunked(size):
+    return _validator(size, argspec_validate.DEFAULT_CHUNK_SIZE)
+
+
+@benchmark("validate/large/errors/{size}", size=[1000, 100000])
+def bench_large_errors(size):
+    # every element is invalid, the error limit stops validation early
+    config = [{"vlan": "x"} for _idx in range(size)]
+
+    def run():
+        return argspec_validate.AnsibleArgSpecValidator(
+            data={"config": config},
+            schema=DOCUMENTATION,
+            schema_format="doc",
+            name="bench",
+            chunk_size=argspec_validate.DEFAULT_CHUNK_SIZE,
+        ).validate()
+
+    return run
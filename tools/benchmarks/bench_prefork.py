@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""The first task of forked workers, with and without pre-fork warming
+
+A call forks a number of workers, each validates a first task as the add
+action does and exits. The workers are forked from a process that either
+compiled the action plugins with warm_action_plugins, as the prefork_warm
+callback does in the controller, or did not. The time per call divided by
+the workers is the first task latency of a worker, fork included.
+
+The memory of the workers is measured end to end with
+tools/scale/run_scale.py --prefork-warm both
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+
+from harness import benchmark
+
+from ansible_collections.cidrblock.conn_test.plugins.action.add import (
+    ARGSPEC_CONDITIONALS,
+)
+from ansible_collections.cidrblock.conn_test.plugins.module_utils import (
+    argspec_validate,
+)
+from ansible_collections.cidrblock.conn_test.plugins.modules.add import (
+    DOCUMENTATION,
+)
+from ansible_collections.cidrblock.conn_test.plugins.plugin_utils.prefork import (
+    warm_action_plugins,
+)
+
+DATA = {"first": 1, "second": 10, "third": 10, "fourth": 21}
+WORKERS = [1, 8]
+
+
+def _first_task():
+    valid, errors, _params = argspec_validate.AnsibleArgSpecValidator(
+        data=dict(DATA),
+        schema=DOCUMENTATION,
+        schema_format="doc",
+        schema_conditionals=ARGSPEC_CONDITIONALS,
+        name="cidrblock.conn_test.add",
+        memoize=True,
+    ).validate()
+    return 0 if valid else 1
+
+
+@benchmark("prefork/first_task/{mode}/{workers}_workers", mode=["cold", "warm"], workers=WORKERS)
+def bench_first_task(mode, workers):
+    argspec_validate.SCHEMA_REGISTRY.clear()
+    argspec_validate.VALIDATION_CACHE.clear()
+    if mode == "warm":
+        warm_action_plugins(["add"])
+
+    def run():
+        pids = []
+        for _idx in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                os._exit(_first_task())
+            pids.append(pid)
+        for pid in pids:
+            _pid, status = os.waitpid(pid, 0)
+            if status:
+                raise RuntimeError("the first task failed in a worker")
+
+    def cleanup():
+        argspec_validate.SCHEMA_REGISTRY.clear()
+
+    run.cleanup = cleanup
+    return run
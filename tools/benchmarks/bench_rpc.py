@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""JSON-RPC calls to a persistent connection, per task
+
+A forked process serves a JsonRpcServer on a unix socket with the accept
+loop of ansible-connection. A task making a number of calls is timed with
+ansible's Connection, a socket per call, with the client the github
+action creates for each task, one socket per task, and with the client
+pipelining the calls.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import socket
+import tempfile
+from multiprocessing import get_context
+
+from harness import benchmark
+
+from ansible.module_utils._text import to_bytes
+from ansible.module_utils.connection import Connection, recv_data, send_data
+from ansible.utils.jsonrpc import JsonRpcServer
+
+from ansible_collections.cidrblock.conn_test.plugins.plugin_utils.rpc_client import (
+    RpcClient,
+)
+
+CALLS = [1, 4, 16]
+
+
+class Methods:
+    """The RPCs served, a small result like get_user returns"""
+
+    def get_user(self):
+        return {"login": "octocat", "id": 1}
+
+
+class Server:
+    def __init__(self):
+        """Serve on a new socket from a forked process, one accepted
+        socket at a time as ansible-connection does
+        """
+        self._dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self._dir, "rpc")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.socket_path)
+        sock.listen(1)
+        self._process = get_context("fork").Process(target=self._serve, args=(sock,))
+        self._process.daemon = True
+        self._process.start()
+        sock.close()
+
+    @staticmethod
+    def _serve(sock):
+        srv = JsonRpcServer()
+        srv.register(Methods())
+        while True:
+            conn, _addr = sock.accept()
+            while True:
+                data = recv_data(conn)
+                if not data:
+                    break
+                send_data(conn, to_bytes(srv.handle_request(data)))
+            conn.close()
+
+    def shutdown(self):
+        self._process.terminate()
+        self._process.join()
+        shutil.rmtree(self._dir)
+
+
+def _task(calls, mode):
+    server = Server()
+    if mode == "connection":
+
+        def run():
+            connection = Connection(server.socket_path)
+            return [connection.get_user() for _idx in range(calls)]
+
+    elif mode == "client":
+
+        def run():
+            client = RpcClient(server.socket_path)
+            try:
+                return [client.get_user() for _idx in range(calls)]
+            finally:
+                client.close()
+
+    else:
+        requests = [("get_user", [], {})] * calls
+
+        def run():
+            client = RpcClient(server.socket_path)
+            try:
+                return client.pipeline(requests)
+            finally:
+                client.close()
+
+    run()
+    run.cleanup = server.shutdown
+    return run
+
+
+@benchmark("rpc/{mode}/{calls}_calls", mode=["connection", "client", "pipeline"], calls=CALLS)
+def bench_rpc(mode, calls):
+    return _task(calls, mode)
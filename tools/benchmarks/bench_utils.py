@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""dict_merge and sort_list on growing trees and lists"""
+from __future__ import absolute_import, division, print_function
+
+import random
+
+from harness import benchmark
+
+from ansible_collections.cidrblock.conn_test.plugins.module_utils.utils import (
+    dict_merge,
+    sort_list,
+)
+
+SIZES = [10, 100, 1000]
+
+
+def make_tree(size, seed):
+    """A tree of about size leaves, mixing nested dicts, lists and scalars
+    shaped like an argspec merged with its conditionals
+
+    :param size: The approximate number of leaves
+    :type size: int
+    :param seed: The seed for the values
+    :type seed: int
+    :return: The tree
+    :rtype: dict
+    """
+    rand = random.Random(seed)
+    tree = {}
+    for idx in range(max(1, size // 10)):
+        tree["option_{idx}".format(idx=idx)] = {
+            "type": "str",
+            "required": rand.random() > 0.5,
+            "choices": [rand.randint(0, 5) for _ in range(4)],
+            "options": dict(
+                ("sub_{sub}".format(sub=sub), {"type": "int"})
+                for sub in range(3)
+            ),
+            "required_together": [["a", "b"], ["c", "d"]],
+        }
+    return tree
+
+
+@benchmark("dict_merge/{size}", size=SIZES)
+def bench_dict_merge(size):
+    base = make_tree(size, seed=1)
+    other = make_tree(size, seed=2)
+    return lambda: dict_merge(base, other)
+
+
+@benchmark("sort_list/scalars/{size}", size=SIZES)
+def bench_sort_list_scalars(size):
+    rand = random.Random(size)
+    values = [rand.randint(0, size) for _ in range(size)]
+    return lambda: sort_list(values)
+
+
+@benchmark("sort_list/dicts/{size}", size=SIZES)
+def bench_sort_list_dicts(size):
+    rand = random.Random(size)
+    values = [
+        {"name": rand.randint(0, size), "value": rand.random()}
+        for _ in range(size)
+    ]
+    return lambda: sort_list(values)
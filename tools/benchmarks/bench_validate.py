@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""AnsibleArgSpecValidator.validate with the add action's schema
+
+Both schema formats are timed on the ArgumentSpecValidator path and the
+MonkeyModule fallback, forced by toggling HAS_ANSIBLE_ARG_SPEC_VALIDATOR.
+The uncompiled benchmarks clear SCHEMA_REGISTRY before every call, so
+each call compiles the doc as a worker's first task does, the setup
+fails if that validation does not pass.
+"""
+from __future__ import absolute_import, division, print_function
+
+from harness import benchmark
+
+from ansible_collections.cidrblock.conn_test.plugins.action.add import (
+    ARGSPEC_CONDITIONALS,
+)
+from ansible_collections.cidrblock.conn_test.plugins.module_utils import (
+    argspec_validate,
+)
+from ansible_collections.cidrblock.conn_test.plugins.modules.add import (
+    DOCUMENTATION,
+)
+
+DATA = {"first": 1, "second": 10, "third": 10, "fourth": 21}
+PATHS = ["argument_spec_validator", "monkey_module"]
+
+
+def _argspec():
+    aav = argspec_validate.AnsibleArgSpecValidator(
+        data={}, schema=DOCUMENTATION, schema_format="doc"
+    )
+    return aav._convert_doc_to_schema()
+
+
+def _validator(schema, schema_format, path, data=DATA, chunk_size=None, compiled=True):
+    use_asv = path == "argument_spec_validator"
+    if use_asv and not argspec_validate.HAS_ANSIBLE_ARG_SPEC_VALIDATOR:
+        raise RuntimeError("ArgumentSpecValidator is not available")
+
+    def run():
+        saved = argspec_validate.HAS_ANSIBLE_ARG_SPEC_VALIDATOR
+        argspec_validate.HAS_ANSIBLE_ARG_SPEC_VALIDATOR = use_asv
+        if not compiled:
+            argspec_validate.SCHEMA_REGISTRY.clear()
+        try:
+            return argspec_validate.AnsibleArgSpecValidator(
+                data=dict(data),
+                schema=schema,
+                schema_format=schema_format,
+                schema_conditionals=ARGSPEC_CONDITIONALS,
+                name="cidrblock.conn_test.add",
+                chunk_size=chunk_size,
+            ).validate()
+        finally:
+            argspec_validate.HAS_ANSIBLE_ARG_SPEC_VALIDATOR = saved
+
+    valid, errors, _params = run()
+    if not valid:
+        raise RuntimeError(errors)
+    return run
+
+
+@benchmark("validate/doc/{path}", path=PATHS)
+def bench_validate_doc(path):
+    return _validator(DOCUMENTATION, "doc", path)
+
+
+@benchmark("validate/argspec/{path}", path=PATHS)
+def bench_validate_argspec(path):
+    return _validator(_argspec(), "argspec", path)
+
+
+@benchmark("validate/doc/uncompiled/{path}/{mode}", path=PATHS, mode=["whole", "chunked"])
+def bench_validate_uncompiled(path, mode):
+    if mode == "whole":
+        return _validator(DOCUMENTATION, "doc", path, compiled=False)
+    operands = [{"first": idx, "second": 10} for idx in range(10)]
+    return _validator(
+        DOCUMENTATION,
+        "doc",
+        path,
+        data={"operands": operands},
+        chunk_size=argspec_validate.DEFAULT_CHUNK_SIZE,
+        compiled=False,
+    )
+
+
+def _tagged(value):
+    """A value as ansible 2.19 passes a task arg, tagged with its origin,
+    a subclass of its type on earlier versions
+    """
+    try:
+        from ansible._internal._datatag._tags import Origin
+        from ansible.module_utils._internal._datatag import AnsibleTagHelper
+    except ImportError:
+        return type("Tagged", (type(value),), {})(value)
+    return AnsibleTagHelper.tag(value, [Origin(path="/site.yaml", line_num=1)])
+
+
+def _template(value):
+    """A template ansible would render, trusted for templating on 2.19"""
+    template = "{{ " + value + " }}"
+    try:
+        from ansible.template import trust_as_template
+    except ImportError:
+        return template
+    return trust_as_template(template)
+
+
+@benchmark("validate/doc/memoized/{state}", state=["hit", "tagged", "bypass"])
+def bench_validate_memoized(state):
+    data = dict(DATA)
+    if state == "tagged":
+        data = {_tagged(k): _tagged(v) for k, v in DATA.items()}
+    elif state == "bypass":
+        # a template is not cached, it fails validation as it is not rendered
+        data["first"] = _template("1")
+    argspec_validate.VALIDATION_CACHE.clear()
+
+    def run():
+        return argspec_validate.AnsibleArgSpecValidator(
+            data=dict(data),
+            schema=DOCUMENTATION,
+            schema_format="doc",
+            schema_conditionals=ARGSPEC_CONDITIONALS,
+            name="cidrblock.conn_test.add",
+            memoize=True,
+        ).validate()
+
+    run()
+    run()
+    if (argspec_validate.VALIDATION_CACHE.hits > 0) != (state != "bypass"):
+        raise RuntimeError(
+            "{0}: {1}".format(state, argspec_validate.VALIDATION_CACHE.stats())
+        )
+    return run
+
+
+@benchmark("validate/doc/fragment/{state}", state=["cached", "cold"])
+def bench_validate_fragment(state):
+    from ansible_collections.cidrblock.conn_test.plugins.module_utils.doc_fragments import (
+        FRAGMENT_INDEX,
+    )
+
+    # ansible's files fragment, extended as a network module would
+    # extend a shared provider fragment
+    schema = DOCUMENTATION + "extends_documentation_fragment:\n- files\n"
+
+    def run():
+        if state == "cold":
+            FRAGMENT_INDEX.clear()
+            argspec_validate.SCHEMA_REGISTRY.clear()
+        return argspec_validate.AnsibleArgSpecValidator(
+            data=dict(DATA),
+            schema=schema,
+            schema_format="doc",
+            schema_conditionals=ARGSPEC_CONDITIONALS,
+            name="cidrblock.conn_test.add",
+        ).validate()
+
+    valid, errors, _params = run()
+    if not valid:
+        raise RuntimeError(errors)
+    return run
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Registration and timing of the offline benchmarks
+
+A benchmark is a setup function registered with @benchmark, it returns the
+callable that is timed. Parameters are expanded into one benchmark per value:
+
+@benchmark("dict_merge/{size}", size=[10, 100, 1000])
+def bench_dict_merge(size):
+    base, other = make_trees(size)
+    return lambda: dict_merge(base, other)
+
+The callable may carry a cleanup function, called after timing, and a
+measure_memory flag to record the peak memory allocated by a single call.
+"""
+from __future__ import absolute_import, division, print_function
+
+import itertools
+import os
+import platform
+import timeit
+import tracemalloc
+
+COLLECTIONS_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "collections")
+)
+
+BENCHMARKS = []
+
+
+def benchmark(name, **params):
+    """Register a benchmark setup function
+
+    :param name: The name of the benchmark, formatted with the params
+    :type name: str
+    :param params: Lists of values, one benchmark is registered per combination
+    :type params: dict
+    """
+
+    def register(func):
+        keys = sorted(params)
+        for values in itertools.product(*(params[key] for key in keys)):
+            kwargs = dict(zip(keys, values))
+            BENCHMARKS.append((name.format(**kwargs), func, kwargs))
+        return func
+
+    return register
+
+
+def install_collection_loader():
+    """Make the collection in this repository importable
+    as ansible_collections.cidrblock.conn_test
+    """
+    from ansible.utils.collection_loader._collection_finder import (
+        _AnsibleCollectionFinder,
+    )
+
+    _AnsibleCollectionFinder(paths=[COLLECTIONS_PATH])._install()
+
+
+def time_benchmark(func, kwargs, repeat=5, min_time=0.2):
+    """Time a single benchmark
+
+    :param func: The setup function
+    :type func: Callable
+    :param kwargs: The params for the setup function
+    :type kwargs: dict
+    :param repeat: The number of timing runs
+    :type repeat: int
+    :param min_time: The minimum seconds per timing run
+    :type min_time: float
+    :return: The best and median seconds per call, the calls per run
+        and the peak bytes of a call if measured
+    :rtype: dict
+    """
+    target = func(**kwargs)
+    timer = timeit.Timer(target)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    runs = sorted(timer.repeat(repeat=repeat, number=number))
+    result = {
+        "best": runs[0] / number,
+        "median": runs[len(runs) // 2] / number,
+        "number": number,
+    }
+    if getattr(target, "measure_memory", False):
+        tracemalloc.start()
+        try:
+            target()
+            result["peak"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    cleanup = getattr(target, "cleanup", None)
+    if cleanup is not None:
+        cleanup()
+    return result
+
+
+def environment():
+    """Describe the environment the benchmarks ran in
+
+    :return: The python and ansible versions and the platform
+    :rtype: dict
+    """
+    from ansible.release import __version__ as ansible_version
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "ansible": ansible_version,
+        "platform": platform.platform(),
+    }
+
+
+def compare(baseline, current, threshold):
+    """Compare results against a baseline
+
+    :param baseline: The saved results
+    :type baseline: dict
+    :param current: The current results
+    :type current: dict
+    :param threshold: The percentage slowdown considered a regression
+    :type threshold: float
+    :return: A row per benchmark and the names of the regressions
+    :rtype: tuple
+    """
+    rows = []
+    regressions = []
+    for name in sorted(set(baseline) | set(current)):
+        if name not in baseline or name not in current:
+            rows.append((name, baseline.get(name), current.get(name), None))
+            continue
+        before = baseline[name]["best"]
+        after = current[name]["best"]
+        change = (after - before) / before * 100 if before else 0.0
+        rows.append((name, baseline[name], current[name], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
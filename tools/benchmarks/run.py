@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Run the offline benchmarks, save a baseline or compare against one
+
+python tools/benchmarks/run.py --list
+python tools/benchmarks/run.py --save baseline.json
+python tools/benchmarks/run.py --compare baseline.json --threshold 10
+python tools/benchmarks/run.py --filter dict_merge
+
+The comparison exits with 1 if any benchmark is slower than the
+baseline by more than the threshold percentage.
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import sys
+
+from harness import (
+    BENCHMARKS,
+    compare,
+    environment,
+    install_collection_loader,
+    time_benchmark,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_suites():
+    """Import every bench_*.py so its benchmarks are registered"""
+    install_collection_loader()
+    for path in sorted(glob.glob(os.path.join(HERE, "bench_*.py"))):
+        importlib.import_module(os.path.basename(path)[:-3])
+
+
+def _us(value):
+    return "{:.2f}".format(value * 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks")
+    parser.add_argument(
+        "--filter", help="only run benchmarks containing this string"
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="list the benchmarks and exit"
+    )
+    parser.add_argument("--save", help="save the results to this json file")
+    parser.add_argument(
+        "--compare", help="compare the results against this json file"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="percentage slowdown reported as a regression (default: 10)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="timing runs per benchmark (default: 5)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="minimum seconds per timing run (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+
+    load_suites()
+    selected = [
+        entry
+        for entry in BENCHMARKS
+        if not args.filter or args.filter in entry[0]
+    ]
+    if args.list:
+        for name, _func, _kwargs in selected:
+            print(name)
+        return 0
+
+    results = {}
+    for name, func, kwargs in selected:
+        results[name] = time_benchmark(
+            func, kwargs, repeat=args.repeat, min_time=args.min_time
+        )
+        peak = results[name].get("peak")
+        print(
+            "{name:<60} {best:>12} us/call{peak}".format(
+                name=name,
+                best=_us(results[name]["best"]),
+                peak=""
+                if peak is None
+                else " {:>10.1f} KiB peak".format(peak / 1024.0),
+            )
+        )
+        sys.stdout.flush()
+
+    if args.save:
+        with open(args.save, "w") as fhand:
+            json.dump(
+                {"environment": environment(), "results": results},
+                fhand,
+                indent=2,
+                sort_keys=True,
+            )
+
+    if args.compare:
+        with open(args.compare) as fhand:
+            baseline = json.load(fhand)["results"]
+        if args.filter:
+            baseline = dict(
+                (k, v) for k, v in baseline.items() if args.filter in k
+            )
+        rows, regressions = compare(baseline, results, args.threshold)
+        print("")
+        print(
+            "{:<60} {:>12} {:>12} {:>9}".format(
+                "benchmark", "baseline us", "current us", "change"
+            )
+        )
+        for name, before, after, change in rows:
+            print(
+                "{:<60} {:>12} {:>12} {:>9}{}".format(
+                    name,
+                    _us(before["best"]) if before else "-",
+                    _us(after["best"]) if after else "-",
+                    "{:+.1f}%".format(change) if change is not None else "-",
+                    "  REGRESSION" if name in regressions else "",
+                )
+            )
+        if regressions:
+            print(
+                "\n{count} regression(s) beyond {threshold}%".format(
+                    count=len(regressions), threshold=args.threshold
+                )
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Import time of each plugin in the collection, checked against a budget
+
+Each plugin is imported in a fresh interpreter with python -X importtime,
+after the ansible modules a worker or ansible-connection has already
+imported, so only the cost added by the plugin is counted. The median of
+several runs is compared against tools/importtime_budget.json.
+
+python tools/importtime.py
+python tools/importtime.py --check
+python tools/importtime.py --plugin connection.github --top 20
+python tools/importtime.py --update-budget --headroom 3
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLLECTIONS_PATH = os.path.abspath(os.path.join(HERE, "..", "collections"))
+PLUGINS_PATH = os.path.join(
+    COLLECTIONS_PATH, "ansible_collections", "cidrblock", "conn_test", "plugins"
+)
+PLUGINS_PACKAGE = "ansible_collections.cidrblock.conn_test.plugins"
+BUDGET = os.path.join(HERE, "importtime_budget.json")
+MARKER = "-- plugin import --"
+
+# Imported before the marker, a worker and ansible-connection
+# have already paid for these when the plugin is loaded
+PREAMBLE = """
+import sys
+from ansible.utils.collection_loader._collection_finder import (
+    _AnsibleCollectionFinder,
+)
+_AnsibleCollectionFinder(paths=[{path!r}])._install()
+import ansible.plugins.action
+import ansible.plugins.connection
+import ansible.plugins.loader
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+import {module}
+"""
+
+
+def discover():
+    """The plugins in the collection, relative to the plugins directory
+
+    :return: Names like connection.github
+    :rtype: list
+    """
+    plugins = []
+    for path in sorted(glob.glob(os.path.join(PLUGINS_PATH, "*", "*.py"))):
+        if os.path.basename(path) == "__init__.py":
+            continue
+        rel = os.path.relpath(path, PLUGINS_PATH)[:-3]
+        plugins.append(rel.replace(os.sep, "."))
+    return plugins
+
+
+def parse_importtime(stderr):
+    """Parse -X importtime output after the marker
+
+    :param stderr: The stderr of the interpreter
+    :type stderr: str
+    :return: The total microseconds and the (self us, cumulative us, module)
+        of each import
+    :rtype: tuple
+    """
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1 :]
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:") :].split("|")
+        try:
+            own, cumulative = int(parts[0]), int(parts[1])
+        except ValueError:
+            # the header line
+            continue
+        name = parts[2].rstrip()
+        imports.append((own, cumulative, name))
+    # top level imports are the least indented, their cumulative
+    # times include everything they imported
+    if not imports:
+        return 0, imports
+    depth = min(len(name) - len(name.lstrip()) for _o, _c, name in imports)
+    total = sum(
+        cumulative
+        for _own, cumulative, name in imports
+        if len(name) - len(name.lstrip()) == depth
+    )
+    return total, imports
+
+
+def measure(plugin, runs=5):
+    """Measure the import time of a plugin
+
+    :param plugin: The plugin, eg connection.github
+    :type plugin: str
+    :param runs: The number of fresh interpreters to measure
+    :type runs: int
+    :return: The median total microseconds and the imports of that run
+    :rtype: tuple
+    """
+    code = PREAMBLE.format(
+        path=COLLECTIONS_PATH,
+        marker=MARKER,
+        module="{package}.{plugin}".format(
+            package=PLUGINS_PACKAGE, plugin=plugin
+        ),
+    )
+    results = []
+    for _run in range(runs):
+        proc = subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-c", code],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        _stdout, stderr = proc.communicate()
+        stderr = stderr.decode("utf-8", "replace")
+        if proc.returncode:
+            raise RuntimeError(
+                "Importing {plugin} failed:\n{stderr}".format(
+                    plugin=plugin, stderr=stderr[-2000:]
+                )
+            )
+        results.append(parse_importtime(stderr))
+    results.sort(key=lambda r: r[0])
+    return results[len(results) // 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Import time of the collection's plugins"
+    )
+    parser.add_argument(
+        "--plugin",
+        action="append",
+        help="only measure this plugin, eg connection.github",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="interpreters per plugin, the median is used (default: 5)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        help="show the imports with the highest self time",
+    )
+    parser.add_argument("--budget", default=BUDGET, help="the budget file")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="exit with 1 if a plugin exceeds its budget or has none",
+    )
+    parser.add_argument(
+        "--update-budget",
+        action="store_true",
+        help="write the measurements times --headroom as the budget",
+    )
+    parser.add_argument(
+        "--headroom",
+        type=float,
+        default=3.0,
+        help="budget multiplier for --update-budget (default: 3)",
+    )
+    args = parser.parse_args(argv)
+
+    budget = {}
+    if os.path.exists(args.budget):
+        with open(args.budget) as fhand:
+            budget = json.load(fhand)
+
+    over = []
+    missing = []
+    measured = {}
+    print("{:<40} {:>10} {:>10}".format("plugin", "ms", "budget ms"))
+    for plugin in args.plugin or discover():
+        total, imports = measure(plugin, runs=args.runs)
+        measured[plugin] = total / 1000.0
+        limit = budget.get(plugin)
+        flag = ""
+        if limit is None:
+            missing.append(plugin)
+            flag = "  NO BUDGET"
+        elif measured[plugin] > limit:
+            over.append(plugin)
+            flag = "  OVER BUDGET"
+        print(
+            "{:<40} {:>10.1f} {:>10}{}".format(
+                plugin,
+                measured[plugin],
+                "-" if limit is None else limit,
+                flag,
+            )
+        )
+        if args.top:
+            for own, cumulative, name in sorted(imports, reverse=True)[
+                : args.top
+            ]:
+                print(
+                    "    {own:>8.1f} {cumulative:>8.1f}  {name}".format(
+                        own=own / 1000.0,
+                        cumulative=cumulative / 1000.0,
+                        name=name.strip(),
+                    )
+                )
+
+    if args.update_budget:
+        budget.update(
+            dict(
+                (plugin, round(max(value * args.headroom, 5.0), 1))
+                for plugin, value in measured.items()
+            )
+        )
+        with open(args.budget, "w") as fhand:
+            json.dump(budget, fhand, indent=2, sort_keys=True)
+            fhand.write("\n")
+        missing = []
+
+    if args.check and (over or missing):
+        if over:
+            print(
+                "\n{count} plugin(s) over the import time budget".format(
+                    count=len(over)
+                )
+            )
+        if missing:
+            print(
+                "\n{count} plugin(s) without an import time budget, "
+                "add them to {budget}".format(
+                    count=len(missing), budget=args.budget
+                )
+            )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""A local stand-in for the parts of the github API used by the collection
+
+Serves /user, /orgs/<org> and the paginated /orgs/<org>/repos with a
+configurable latency and counts the requests by path. Point the
+cidrblock.conn_test.github connection at it with ansible_gh_base_url.
+
+python tools/scale/fake_github.py --port 8080 --latency-ms 50 --repos 300
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+except ImportError:  # pragma: no cover
+    raise SystemExit("python 3.7 or later is required")
+
+ORG_RE = re.compile(r"^/orgs/(?P<org>[^/]+)$")
+REPOS_RE = re.compile(r"^/orgs/(?P<org>[^/]+)/repos$")
+
+
+class FakeGithub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, repos=100):
+        """
+        :param address: The host and port to listen on, port 0 for any
+        :type address: tuple
+        :param latency: The seconds to wait before each response
+        :type latency: float
+        :param repos: The number of repositories in every organization
+        :type repos: int
+        """
+        ThreadingHTTPServer.__init__(self, address, _Handler)
+        self.latency = latency
+        self.repos = repos
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://{host}:{port}".format(
+            host=self.server_address[0], port=self.server_address[1]
+        )
+
+    def count(self, path):
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+
+    def counts(self, reset=False):
+        """The requests served by path
+
+        :param reset: Reset the counts
+        :type reset: bool
+        :return: The number of requests per path
+        :rtype: dict
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            if reset:
+                self._counts.clear()
+        return counts
+
+    def start(self):
+        """Serve from a daemon thread"""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", "5000")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        if url.path == "/user":
+            server.count("/user")
+            return self._send(
+                200,
+                {
+                    "login": "scale",
+                    "id": 1,
+                    "type": "User",
+                    "url": server.url + "/user",
+                },
+            )
+
+        match = ORG_RE.match(url.path)
+        if match:
+            server.count("/orgs/{org}")
+            org = match.group("org")
+            return self._send(
+                200,
+                {
+                    "login": org,
+                    "id": 2,
+                    "type": "Organization",
+                    "url": "{base}/orgs/{org}".format(base=server.url, org=org),
+                    "repos_url": "{base}/orgs/{org}/repos".format(
+                        base=server.url, org=org
+                    ),
+                },
+            )
+
+        match = REPOS_RE.match(url.path)
+        if match:
+            server.count("/orgs/{org}/repos")
+            org = match.group("org")
+            query = parse_qs(url.query)
+            page = int(query.get("page", ["1"])[0])
+            per_page = int(query.get("per_page", ["30"])[0])
+            start = (page - 1) * per_page
+            names = range(start, min(start + per_page, server.repos))
+            body = [
+                {
+                    "id": 1000 + idx,
+                    "name": "repo_{idx}".format(idx=idx),
+                    "full_name": "{org}/repo_{idx}".format(org=org, idx=idx),
+                }
+                for idx in names
+            ]
+            headers = {}
+            if start + per_page < server.repos:
+                headers["Link"] = (
+                    '<{base}{path}?page={page}&per_page={per_page}>; rel="next"'
+                ).format(
+                    base=server.url,
+                    path=url.path,
+                    page=page + 1,
+                    per_page=per_page,
+                )
+            return self._send(200, body, headers)
+
+        server.count("unknown")
+        return self._send(404, {"message": "Not Found"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="A local github stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="milliseconds to wait before each response",
+    )
+    parser.add_argument(
+        "--repos", type=int, default=100, help="repositories per organization"
+    )
+    args = parser.parse_args(argv)
+    server = FakeGithub(
+        (args.host, args.port),
+        latency=args.latency_ms / 1000.0,
+        repos=args.repos,
+    )
+    print("Serving on {url}".format(url=server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.counts(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
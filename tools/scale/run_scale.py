@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2021 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""End to end scale runs, N hosts by M tasks across fork counts
+
+Generates an inventory of cidrblock.conn_test.demo hosts and a single
+cidrblock.conn_test.github host pointed at a local fake github server,
+runs site.yaml and try_github.yaml style plays with ansible-playbook for
+every host count and fork count and reports:
+
+- task results per second and the per task overhead in worker seconds,
+  a run with failed or unreachable hosts or a non-zero exit is marked
+  FAILED and has neither
+- the peak RSS of the controller, a single worker, all workers together
+  and the ansible-connection processes (sampled from /proc, linux only)
+- the peak unique set size of all workers together, the memory they do
+  not share with the controller
+- the requests made to the fake github server
+
+With --prefork-warm the plays are also run with the prefork_warm callback,
+which compiles the action plugin argspecs in the controller before the
+workers fork.
+
+python tools/scale/run_scale.py --hosts 100,1000 --tasks 5 --forks 5,20,50
+python tools/scale/run_scale.py --plays github --latency-ms 100 --output scale.json
+python tools/scale/run_scale.py --plays site --prefork-warm both
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from fake_github import FakeGithub
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+COLLECTIONS_PATH = os.path.join(REPO, "collections")
+
+RECAP_RE = re.compile(
+    r"^\S+\s+: ok=(?P<ok>\d+)\s+changed=(?P<changed>\d+)\s+"
+    r"unreachable=(?P<unreachable>\d+)\s+failed=(?P<failed>\d+)\s+"
+    r"skipped=(?P<skipped>\d+)\s+rescued=(?P<rescued>\d+)\s+"
+    r"ignored=(?P<ignored>\d+)",
+    re.MULTILINE,
+)
+CONNECTION_NAMES = ("ansible-connection", "ansible_connection_cli_stub")
+PREFORK_WARM_CALLBACK = "cidrblock.conn_test.prefork_warm"
+
+SITE_TASK = """
+  - cidrblock.conn_test.add:
+      first: {idx}
+      second: 10
+      third: 1
+      fourth: 2
+"""
+GITHUB_TASK = """
+  - cidrblock.conn_test.github:
+      get: {get}
+"""
+
+
+def generate(workdir, hosts, tasks, github_url):
+    """Write the inventory and playbooks
+
+    :param workdir: The directory to write to
+    :type workdir: str
+    :param hosts: The number of demo hosts
+    :type hosts: int
+    :param tasks: The number of tasks in each play
+    :type tasks: int
+    :param github_url: The base url of the fake github server
+    :type github_url: str
+    """
+    with open(os.path.join(workdir, "inventory.yaml"), "w") as fhand:
+        fhand.write("all:\n  children:\n    demo:\n      hosts:\n")
+        for idx in range(hosts):
+            fhand.write("        mock_host{idx}:\n".format(idx=idx))
+        fhand.write(
+            "      vars:\n"
+            "        ansible_connection: cidrblock.conn_test.demo\n"
+            "        ansible_user: scale\n"
+            "        ansible_password: password\n"
+            "    github:\n"
+            "      hosts:\n"
+            "        gh_api_endpoint:\n"
+            "          ansible_connection: cidrblock.conn_test.github\n"
+            "          ansible_gh_access_token: scale\n"
+            "          ansible_gh_base_url: {url}\n".format(url=github_url)
+        )
+    with open(os.path.join(workdir, "site.yaml"), "w") as fhand:
+        fhand.write("- hosts: demo\n  gather_facts: False\n  tasks:\n")
+        for idx in range(tasks):
+            fhand.write(SITE_TASK.format(idx=idx))
+    with open(os.path.join(workdir, "github.yaml"), "w") as fhand:
+        fhand.write("- hosts: github\n  gather_facts: False\n  tasks:\n")
+        for idx in range(tasks):
+            fhand.write(GITHUB_TASK.format(get=("user", "org")[idx % 2]))
+
+
+def _rss(pid):
+    """The resident set size of a process in bytes"""
+    try:
+        with open("/proc/{pid}/status".format(pid=pid)) as fhand:
+            for line in fhand:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    return 0
+
+
+def _uss(pid):
+    """The unique set size of a process in bytes, the pages
+    not shared with other processes
+    """
+    uss = 0
+    try:
+        with open("/proc/{pid}/smaps_rollup".format(pid=pid)) as fhand:
+            for line in fhand:
+                if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                    uss += int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    return uss
+
+
+def _processes():
+    """The pid, parent pid and command line of every process"""
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{pid}/stat".format(pid=entry)) as fhand:
+                stat = fhand.read()
+            with open("/proc/{pid}/cmdline".format(pid=entry), "rb") as fhand:
+                cmdline = fhand.read().replace(b"\0", b" ").decode(
+                    "utf-8", "replace"
+                )
+        except (IOError, OSError):
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        yield int(entry), ppid, cmdline
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval=0.1):
+        """Sample the RSS of an ansible-playbook run
+
+        Workers are the children of the playbook process, the
+        ansible-connection processes are daemonized so they are found by
+        the playbook pid in their command line
+
+        :param pid: The pid of ansible-playbook
+        :type pid: int
+        :param interval: The seconds between samples
+        :type interval: float
+        """
+        super(RssSampler, self).__init__()
+        self.daemon = True
+        self._pid = pid
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self.controller = 0
+        self.worker = 0
+        self.workers = 0
+        self.workers_uss = 0
+        self.connection = 0
+        self.connections = 0
+
+    def run(self):
+        if not os.path.isdir("/proc"):
+            return
+        marker = " {pid} ".format(pid=self._pid)
+        while not self._stop_event.wait(self._interval):
+            workers = workers_uss = connections = 0
+            for pid, ppid, cmdline in _processes():
+                if pid == self._pid:
+                    self.controller = max(self.controller, _rss(pid))
+                elif ppid == self._pid:
+                    rss = _rss(pid)
+                    self.worker = max(self.worker, rss)
+                    workers += rss
+                    workers_uss += _uss(pid)
+                elif marker in cmdline and any(
+                    name in cmdline for name in CONNECTION_NAMES
+                ):
+                    rss = _rss(pid)
+                    self.connection = max(self.connection, rss)
+                    connections += rss
+            self.workers = max(self.workers, workers)
+            self.workers_uss = max(self.workers_uss, workers_uss)
+            self.connections = max(self.connections, connections)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_playbook(workdir, playbook, forks, hosts, env):
+    """Run a playbook and measure it
+
+    :param workdir: The directory with the inventory and playbooks
+    :type workdir: str
+    :param playbook: The playbook file name
+    :type playbook: str
+    :param forks: The number of forks
+    :type forks: int
+    :param hosts: The number of hosts in the play
+    :type hosts: int
+    :param env: The environment for ansible-playbook
+    :type env: dict
+    :return: The measurements, a failed run has no rates
+    :rtype: dict
+    """
+    command = [
+        "ansible-playbook",
+        "-i",
+        os.path.join(workdir, "inventory.yaml"),
+        "-f",
+        str(forks),
+        os.path.join(workdir, playbook),
+    ]
+    started = time.time()
+    proc = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=env,
+        cwd=workdir,
+    )
+    sampler = RssSampler(proc.pid)
+    sampler.start()
+    output = proc.communicate()[0].decode("utf-8", "replace")
+    wall = time.time() - started
+    sampler.stop()
+
+    results = dict.fromkeys(
+        ("ok", "changed", "unreachable", "failed", "skipped", "ignored"), 0
+    )
+    for match in RECAP_RE.finditer(output):
+        for key in results:
+            results[key] += int(match.group(key))
+    # ok counts the changed and ignored results too
+    completed = results["ok"]
+    failed = bool(
+        proc.returncode or results["failed"] or results["unreachable"]
+    )
+    return {
+        "returncode": proc.returncode,
+        "failed": failed,
+        "wall": wall,
+        "results": results,
+        "tasks_per_second": None if failed or not wall else completed / wall,
+        # worker seconds per task, only min(forks, hosts) workers are busy
+        "task_overhead": None
+        if failed or not completed
+        else wall * min(forks, hosts) / completed,
+        "rss": {
+            "controller": sampler.controller,
+            "worker": sampler.worker,
+            "workers": sampler.workers,
+            "workers_uss": sampler.workers_uss,
+            "connection": sampler.connection,
+            "connections": sampler.connections,
+        },
+        "output": output if proc.returncode else None,
+    }
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",")]
+
+
+def _mb(value):
+    return "{:.1f}".format(value / 1024.0 / 1024.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="End to end scale runs across host and fork counts"
+    )
+    parser.add_argument(
+        "--hosts",
+        type=_ints,
+        default=[100, 1000],
+        help="comma separated demo host counts (default: 100,1000)",
+    )
+    parser.add_argument(
+        "--tasks", type=int, default=5, help="tasks per play (default: 5)"
+    )
+    parser.add_argument(
+        "--forks",
+        type=_ints,
+        default=[5, 20, 50],
+        help="comma separated fork counts (default: 5,20,50)",
+    )
+    parser.add_argument(
+        "--plays",
+        default="site,github",
+        help="comma separated plays to run, site and/or github",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=20.0,
+        help="fake github latency per request (default: 20)",
+    )
+    parser.add_argument(
+        "--repos",
+        type=int,
+        default=100,
+        help="repositories in the fake github organization (default: 100)",
+    )
+    parser.add_argument(
+        "--prefork-warm",
+        choices=["off", "on", "both"],
+        default="off",
+        help="run with the prefork_warm callback, without it or both (default: off)",
+    )
+    parser.add_argument("--output", help="write the results to a json file")
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the generated files"
+    )
+    args = parser.parse_args(argv)
+
+    server = FakeGithub(
+        ("127.0.0.1", 0), latency=args.latency_ms / 1000.0, repos=args.repos
+    )
+    server.start()
+    workdir = tempfile.mkdtemp(prefix="conn_test_scale_")
+    env = dict(os.environ)
+    env.update(
+        {
+            "ANSIBLE_COLLECTIONS_PATH": COLLECTIONS_PATH,
+            "ANSIBLE_PERSISTENT_CONTROL_PATH_DIR": os.path.join(workdir, "pc"),
+            "ANSIBLE_LOCAL_TEMP": os.path.join(workdir, "tmp"),
+            "ANSIBLE_RETRY_FILES_ENABLED": "False",
+            "ANSIBLE_NOCOLOR": "True",
+        }
+    )
+    plays = {"site": "site.yaml", "github": "github.yaml"}
+    warm_modes = {"off": [False], "on": [True], "both": [False, True]}[
+        args.prefork_warm
+    ]
+    runs = []
+    print(
+        "{:<7} {:>4} {:>6} {:>6} {:>6} {:>8} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {}".format(
+            "play",
+            "warm",
+            "hosts",
+            "tasks",
+            "forks",
+            "wall s",
+            "tasks/s",
+            "ovh ms",
+            "worker",
+            "workers",
+            "wrk uss",
+            "conn",
+            "ctrl",
+            "requests",
+        )
+    )
+    try:
+        for hosts in args.hosts:
+            generate(workdir, hosts, args.tasks, server.url)
+            for play in args.plays.split(","):
+                for forks, warm in itertools.product(args.forks, warm_modes):
+                    server.counts(reset=True)
+                    play_hosts = hosts if play == "site" else 1
+                    play_env = dict(env)
+                    if warm:
+                        play_env["ANSIBLE_CALLBACKS_ENABLED"] = PREFORK_WARM_CALLBACK
+                    result = run_playbook(
+                        workdir, plays[play], forks, play_hosts, play_env
+                    )
+                    result.update(
+                        {
+                            "play": play,
+                            "prefork_warm": warm,
+                            "hosts": play_hosts,
+                            "tasks": args.tasks,
+                            "forks": forks,
+                            "requests": server.counts(),
+                        }
+                    )
+                    runs.append(result)
+                    overhead = result["task_overhead"]
+                    rate = result["tasks_per_second"]
+                    print(
+                        "{:<7} {:>4} {:>6} {:>6} {:>6} {:>8.2f} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {}{}".format(
+                            play,
+                            "on" if warm else "off",
+                            result["hosts"],
+                            args.tasks,
+                            forks,
+                            result["wall"],
+                            "-" if rate is None else "{:.1f}".format(rate),
+                            "-"
+                            if overhead is None
+                            else "{:.1f}".format(overhead * 1000),
+                            _mb(result["rss"]["worker"]),
+                            _mb(result["rss"]["workers"]),
+                            _mb(result["rss"]["workers_uss"]),
+                            _mb(result["rss"]["connections"]),
+                            _mb(result["rss"]["controller"]),
+                            sum(result["requests"].values()),
+                            " FAILED" if result["failed"] else "",
+                        )
+                    )
+                    if result["returncode"]:
+                        print(
+                            "ansible-playbook exited with {rc}, last output:\n{out}".format(
+                                rc=result["returncode"],
+                                out=result["output"][-2000:],
+                            )
+                        )
+                    sys.stdout.flush()
+    finally:
+        server.shutdown()
+        if args.keep:
+            print("Generated files kept in {workdir}".format(workdir=workdir))
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as fhand:
+            json.dump(
+                {
+                    "latency_ms": args.latency_ms,
+                    "repos": args.repos,
+                    "runs": runs,
+                },
+                fhand,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())